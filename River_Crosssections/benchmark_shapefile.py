@@ -0,0 +1,177 @@
+"""Benchmark of the read and write paths of shapefile.py.
+
+Generates synthetic point, polyline and polygon (with holes) shapefiles with
+a given number of vertices and a wide attribute table, times Writer.save(),
+Reader.shapes(), Reader.iterShapes(), Reader.records() and random access
+with Reader.shape(i), and writes the results as JSON. The data is generated
+from a fixed seed so runs are comparable, e.g.
+
+    python benchmark_shapefile.py --sizes 1e3 1e5 1e6 --output bench_output.txt
+
+Layers of 1e7 vertices are supported but need several GB of memory, as the
+Writer keeps all shapes in memory until save() is called."""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import shapefile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+LINE_VERTICES = 100                 # vertices per polyline
+RING_VERTICES, HOLE_VERTICES = 40, 10  # vertices per polygon ring and hole
+RANDOM_ACCESS = 1000                # number of shape(i) calls timed
+
+
+def make_writer(geometry, vertices, num_fields, rng):
+    """Returns an in-memory Writer holding a synthetic layer with about the
+    given number of vertices and num_fields attribute fields."""
+    if geometry == "point":
+        w = shapefile.Writer(shapefile.POINT)
+        num_shapes = vertices
+    elif geometry == "polyline":
+        w = shapefile.Writer(shapefile.POLYLINE)
+        num_shapes = max(1, vertices // LINE_VERTICES)
+    else:
+        w = shapefile.Writer(shapefile.POLYGON)
+        num_shapes = max(1, vertices // (RING_VERTICES + HOLE_VERTICES))
+    kinds = ["N0", "N3", "C", "D", "L"]
+    for k in range(num_fields):
+        kind = kinds[k % len(kinds)]
+        if kind == "N0":
+            w.field("INT%d" % k, "N", 10, 0)
+        elif kind == "N3":
+            w.field("FLT%d" % k, "N", 16, 3)
+        elif kind == "C":
+            w.field("TXT%d" % k, "C", 24)
+        elif kind == "D":
+            w.field("DAT%d" % k, "D", 8)
+        else:
+            w.field("LOG%d" % k, "L", 1)
+    for i in range(num_shapes):
+        x, y = rng.uniform(0, 1e5), rng.uniform(0, 1e5)
+        if geometry == "point":
+            w.point(x, y)
+        elif geometry == "polyline":
+            w.line(parts=[[[x + j, y + rng.uniform(-5, 5)] for j in range(LINE_VERTICES)]])
+        else:
+            w.poly(parts=[ring(x, y, 50.0, RING_VERTICES, clockwise=True),
+                          ring(x, y, 20.0, HOLE_VERTICES, clockwise=False)])
+        record = []
+        for k in range(num_fields):
+            kind = kinds[k % len(kinds)]
+            if kind == "N0":
+                record.append(rng.randint(0, 10 ** 9))
+            elif kind == "N3":
+                record.append(round(rng.uniform(-1e6, 1e6), 3))
+            elif kind == "C":
+                record.append("feature %d" % i)
+            elif kind == "D":
+                record.append("2019%02d%02d" % (rng.randint(1, 12), rng.randint(1, 28)))
+            else:
+                record.append(rng.choice("TF"))
+        w.record(*record)
+    return w, num_shapes
+
+
+def ring(x, y, radius, n, clockwise):
+    """Returns a closed ring of n vertices around (x, y). Shapefile outer
+    rings are clockwise and holes counter-clockwise."""
+    sign = -1 if clockwise else 1
+    points = [[x + radius * math.cos(sign * 2 * math.pi * j / (n - 1)),
+               y + radius * math.sin(sign * 2 * math.pi * j / (n - 1))] for j in range(n - 1)]
+    return points + [points[0]]
+
+
+def best_of(func, repeat):
+    """Returns the shortest wall time of repeat calls of func."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def consume(iterator):
+    for _ in iterator:
+        pass
+
+
+def run(sizes, geometries, num_fields, repeat, seed, modes):
+    """Runs all benchmarks and returns the list of result rows."""
+    results = []
+    folder = tempfile.mkdtemp(prefix="shapefile_bench_")
+    try:
+        for geometry in geometries:
+            for vertices in sizes:
+                rng = random.Random(seed)
+                w, num_shapes = make_writer(geometry, vertices, num_fields, rng)
+                base = os.path.join(folder, "%s_%d" % (geometry, vertices))
+                row = {"geometry": geometry, "vertices": vertices, "shapes": num_shapes,
+                       "fields": num_fields}
+
+                def result(operation, mode, seconds):
+                    results.append(dict(row, operation=operation, mode=mode, seconds=seconds,
+                                        vertices_per_second=vertices / seconds if seconds else None))
+                    print("%-9s %9d %-12s %-7s %9.4f s" % (geometry, vertices, operation, mode, seconds),
+                          file=sys.stderr)
+
+                result("save", "lists", best_of(lambda: w.save(base), repeat))
+                del w
+                indices = [rng.randrange(num_shapes) for _ in range(RANDOM_ACCESS)]
+                for mode in modes:
+                    kwargs = {"arrays": True} if mode == "arrays" else {}
+                    r = shapefile.Reader(base, **kwargs)
+                    result("shapes", mode, best_of(r.shapes, repeat))
+                    result("iterShapes", mode, best_of(lambda: consume(r.iterShapes()), repeat))
+                    result("shape(i)", mode, best_of(lambda: [r.shape(i) for i in indices], repeat))
+                    for f in (r.shp, r.shx, r.dbf):
+                        f.close()
+                r = shapefile.Reader(base)
+                result("records", "lists", best_of(r.records, repeat))
+                for f in (r.shp, r.shx, r.dbf):
+                    f.close()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1e3, 1e4, 1e5, 1e6],
+                        help="numbers of vertices per layer (default: 1e3 1e4 1e5 1e6)")
+    parser.add_argument("--geometries", nargs="+", default=["point", "polyline", "polygon"],
+                        choices=["point", "polyline", "polygon"])
+    parser.add_argument("--fields", type=int, default=40, help="number of attribute fields")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing, the best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON output file (default: standard output)")
+    args = parser.parse_args()
+
+    modes = ["lists", "arrays"] if np is not None else ["lists"]
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__ if np is not None else None,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": run([int(n) for n in args.sizes], args.geometries, args.fields,
+                       args.repeat, args.seed, modes),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
@@ -125,15 +125,78 @@ def get_closest_point(point, ptslists):
     return [closestpoint, location]
 
 
+def xy_array(ptslists):
+    """
+    converts points to an array of their coordinates
+    :param ptslists: [list of lists of floats]: [[x1,y1,a11,...a1n],[x2,y2,a21,...a2n],...] or an (N, 2+) array
+    :return: (N, 2) array of x and y
+    """
+    if isinstance(ptslists, np.ndarray):
+        return np.asarray(ptslists[:, :2], dtype=float)
+    return np.array([pt[:2] for pt in ptslists], dtype=float).reshape(-1, 2)
+
+
+class PointIndex:
+    """
+    nearest neighbour index over points, built once with a KD-tree (scipy.spatial.cKDTree) and then queried for
+    many points at once instead of scanning all points with get_closest_point for every point
+    - the points are given in the usual list format [[x1,y1,a11,...a1n],[x2,y2,a21,...a2n],...] or as an array,
+      only x and y are indexed and the points are returned as given, so attributes stay attached
+    - locations are the positions of the points in ptslists, as returned by get_closest_point
+    """
+    def __init__(self, ptslists):
+        from scipy.spatial import cKDTree
+        self.ptslists = ptslists
+        self.tree = cKDTree(xy_array(ptslists))
+
+    def __len__(self):
+        return self.tree.n
+
+    def query(self, points, k=1, max_dist=np.inf):
+        """
+        finds the k nearest neighbours of each point
+        :param points: [[x1,y1,...],[x2,y2,...],...] or an (M, 2+) array
+        :param k: number of neighbours per point
+        :param max_dist: neighbours further away than max_dist are not returned
+        :return: dists, locations: (M, k) arrays sorted by distance, missing neighbours have the distance inf and
+                 the location len(self)
+        """
+        xy = xy_array(points)
+        dists, locations = self.tree.query(xy, k=k, distance_upper_bound=max_dist)
+        return dists.reshape(len(xy), k), locations.reshape(len(xy), k)
+
+    def closest_points(self, points):
+        """
+        batched version of get_closest_point
+        :param points: [[x1,y1,...],[x2,y2,...],...] or an (M, 2+) array
+        :return: [[closestpoint1, location1], [closestpoint2, location2], ...]
+        """
+        dists, locations = self.query(points)
+        return [[self.ptslists[i], i] for i in locations[:, 0].tolist()]
+
+    def closest_point(self, point):
+        """
+        :param point: [x,y,...]
+        :return: [closestpoint, location] like get_closest_point
+        """
+        return self.closest_points([point])[0]
+
+    def within(self, points, radius):
+        """
+        finds all points within radius of each point
+        :param points: [[x1,y1,...],[x2,y2,...],...] or an (M, 2+) array
+        :param radius: search radius
+        :return: one sorted list of locations per point
+        """
+        return [list(locations) for locations in self.tree.query_ball_point(xy_array(points), radius, return_sorted=True)]
+
+
 def map_pts_to_line(ptslist, lft_bank_dist, rgt_bank_dist, bnk_height, aline, out_polyline):
     """
     this function takes a list of points with depth attribute and the according distance to the left and right bank
     (lft_bank_dist, rgt_bank_dist,) and "maps" them to 'aline'
-    - vector is calculated from line
-    - perpendicular unit vector is generated
-    - distance between each point in ptslists and line is calculated
-    - point is moved in direction of the unit vector * distance
-    - make sure the points are sorted along the line and
+    - each point is moved perpendicular onto aline, i.e. its station along aline is calculated
+    - the points are sorted by station, starting at the end closest to the start of aline
     - add the left and right bank to the length of the line
     - the points are shifted to match the length of aline
     - bnk_height is added to the depths
@@ -143,61 +206,29 @@ def map_pts_to_line(ptslist, lft_bank_dist, rgt_bank_dist, bnk_height, aline, ou
     :param bnk_height: height of the bank above water surface, Type: float
     :param aline: points that define a line to which the xs points are mapped [[x1,y1],[x2,y2]], Type List
     """
-    pline = perp_line(aline[0], aline[1], 1)  # the line with length 1 along which the point is moved
-    pvt = vector(pline[0], pline[1])  # converting to pline to vector
-    moved_pts = []
-    for pt_to_move in ptslist:
-        # get correct direction from pt to line: create arbitrary line from pt_to_move along the vector
-        # find intersect point of resulting line with aline
-        # vector to move is from pt_to_move to intersect point
-        line = [pt_to_move, move_pt_along_vector(pt_to_move, pvt, 1)]
-        intersect_pt = intersect_pt_endless_lines(line, aline)
-        mvt = vector(pt_to_move, intersect_pt)  # the move vector
-        dist = dist_pt_ln(pt_to_move, aline)  # distance by which the point is moved
-        moved_pts.append(move_pt_along_vector(pt_to_move,mvt,dist))
-
-    # moved_pts are ordered along a line and hence, the outer most points can be found by the following logic
-    x_lst, y_lst, d_lst = [],[],[]
-    for pt in moved_pts:
-        x_lst.append(pt[0])
-        y_lst.append(pt[1])
-        d_lst.append(pt[2])
-    idx_minx = min(range(len(x_lst)), key=x_lst.__getitem__)
-    idx_maxx = max(range(len(x_lst)), key=x_lst.__getitem__)
-    idx_miny = min(range(len(y_lst)), key=y_lst.__getitem__)
-    idx_maxy = max(range(len(y_lst)), key=y_lst.__getitem__)
-
-    if idx_minx == idx_miny:
-        pt1 = [x_lst[idx_minx],y_lst[idx_miny],d_lst[idx_minx]]
-    elif idx_minx == idx_maxy:
-        pt1 = [x_lst[idx_minx],y_lst[idx_maxy],d_lst[idx_minx]]
-    if idx_maxx == idx_miny:
-        pt2 = [x_lst[idx_maxx],y_lst[idx_miny],d_lst[idx_maxx]]
-    elif idx_maxx == idx_maxy:
-        pt2 = [x_lst[idx_maxx],y_lst[idx_maxy],d_lst[idx_maxx]]
-    # sort the points
-    moved_pts_sorted = []
-    moved_pts_sorted.append(get_closest_point(aline[0],[pt1, pt2])[0])
-    moved_pts.remove(moved_pts_sorted[0])
-    nr_iterations = len(moved_pts)
-    for i in range(nr_iterations):
-        actual_pt = get_closest_point(moved_pts_sorted[-1],moved_pts)[0]
-        moved_pts.remove(actual_pt)
-        moved_pts_sorted.append(actual_pt)
+    # all points are moved perpendicular onto aline, so each point is fully described by its station along
+    # aline (one dot product with the unit vector of aline), which also orders the points along the line
+    pts = np.asarray([pt[:3] for pt in ptslist], dtype=float)
+    start = np.asarray(aline[0][:2], dtype=float)
+    uvt = unit_vectors(vectors(start, np.asarray(aline[1][:2], dtype=float)))
+    stations = (pts[:, :2] - start).dot(uvt)
+    # start with the outer most point that is closest to the start of aline
+    order = np.argsort(stations, kind='stable')
+    if abs(stations[order[-1]]) < abs(stations[order[0]]):
+        order = np.argsort(-stations, kind='stable')
+    source_dists = np.abs(stations[order] - stations[order[0]])  # distances along the line from the first point
+    depths = pts[order, 2]
 
     DrawPolyline(out_polyline, [aline])
 
     # shift the points plus bank distances to match the length of aline
     target_length = get_distance(aline[0],aline[1])
-    source_length = lft_bank_dist + get_distance(moved_pts_sorted[0],moved_pts_sorted[-1]) + rgt_bank_dist
-    station_lst = [0, lft_bank_dist * target_length / source_length]  # the distances of depth points from left bank
-    depth_lst = [0,moved_pts_sorted[0][2]+bnk_height]  # the depths of each station, starting with 0 at bank
-    for pt in moved_pts_sorted[1:]:
-        source_dist = get_distance(moved_pts_sorted[0],pt)
-        station_lst.append(station_lst[1] + source_dist * target_length / source_length)
-        depth_lst.append(pt[2]+bnk_height)
-    station_lst.append(station_lst[-1] + rgt_bank_dist * target_length / source_length)  # the distances of elevation points to left bank
-    depth_lst.append(0)
+    source_length = lft_bank_dist + source_dists[-1] + rgt_bank_dist
+    scale = target_length / source_length
+    station_lst = [0, lft_bank_dist * scale]  # the distances of depth points from left bank
+    station_lst.extend((station_lst[1] + source_dists[1:] * scale).tolist())
+    station_lst.append(station_lst[-1] + rgt_bank_dist * scale)  # the distances of elevation points to left bank
+    depth_lst = [0] + (depths + bnk_height).tolist() + [0]  # the depths of each station, starting with 0 at bank
     return station_lst, depth_lst
 
 
@@ -266,8 +297,9 @@ def DrawPolylineWithField(shape_path_str, field_lst, pts_lst_lst):
     write_obj = shapefile.Writer(shapefile.POLYLINE)
     write_obj.autoBalance = 1
     write_obj.field(field_lst[0], field_lst[1], field_lst[2])
+    coords, offsets = ragged_coords(pts_lst_lst)
+    write_obj.polyArrays(coords, offsets, shapeType=3)
     for i,pts_lst in enumerate(pts_lst_lst):
-        write_obj.poly(shapeType=3, parts=[pts_lst])
         write_obj.record(pts_lst[0][2])
     write_obj.save(shape_path_str)
     return True
@@ -290,11 +322,13 @@ def move_pt_along_vector(pt, vt, dist):
     :param pt: [x,y,attr]
     :param uvt: as defined in function
     :param dist: distance by which point is to be moved
-    :return: mpt: [x,y]
+    :return: mpt: [x,y,attr]
     """
-    uvt = unit_vector(vt)
-    mvt = scalar_times_vector(uvt, dist)
-    return [pt[0]+mvt[0],pt[1]+mvt[1],pt[2]]
+    uvt = unit_vector(vt)  # normalized over all components of vt
+    if uvt is False:
+        raise ValueError("cannot move a point along the zero-length vector %s" % (vt,))
+    x, y = (np.asarray(pt[:2], dtype=float) + scalar_times_vectors(np.asarray(uvt[:2]), dist)).tolist()
+    return [x, y, pt[2]]
 
 
 def dist_pt_ln(pt, ln):
@@ -303,14 +337,7 @@ def dist_pt_ln(pt, ln):
     :param ln:  [[x1,y1],[x2,y2]]
     :return: distance between point and line  - line extending unlimited
     """
-    import math
-    x0 = pt[0]
-    y0 = pt[1]
-    x1 = ln[0][0]
-    y1 = ln[0][1]
-    x2 = ln[1][0]
-    y2 = ln[1][1]
-    return abs((y2-y1)*x0-(x2-x1)*y0+x2*y1-y2*x1)/math.sqrt((y2-y1)**2+(x2-x1)**2)
+    return float(dist_pts_lns(np.array(pt[:2], dtype=float), np.array([ln[0][:2], ln[1][:2]], dtype=float)))
 
 
 def intersect_pt_endless_lines(ln1, ln2):
@@ -319,20 +346,17 @@ def intersect_pt_endless_lines(ln1, ln2):
     and defined through two points each
     :param ln1: [[x1,y1],[x2,y2]]
     :param ln2: [[x3,y3],[x4,y4]]
-    :return:
+    :return: [xi,yi], raises ZeroDivisionError for parallel lines
     """
-    x1,y1,x2,y2, = ln1[0][0],ln1[0][1],ln1[1][0],ln1[1][1]
-    x3,y3,x4,y4, = ln2[0][0],ln2[0][1],ln2[1][0],ln2[1][1]
-    xi = ((x1*y2-y1*x2)*(x3-x4)-(x1-x2)*(x3*y4-y3*x4))/((x1-x2)*(y3-y4)-(y1-y2)*(x3-x4))
-    yi = ((x1*y2-y1*x2)*(y3-y4)-(y1-y2)*(x3*y4-y3*x4))/((x1-x2)*(y3-y4)-(y1-y2)*(x3-x4))
+    xi, yi = intersect_pts_endless_lines(np.array([ln1[0][:2], ln1[1][:2]], dtype=float),
+                                         np.array([ln2[0][:2], ln2[1][:2]], dtype=float)).tolist()
+    if not (np.isfinite(xi) and np.isfinite(yi)):
+        raise ZeroDivisionError('the lines are parallel')
     return [xi,yi]
 
 
 def scalar_times_vector(vt, scalar):
-    mvt = []
-    for item in vt:
-        mvt.append(scalar*item)
-    return mvt
+    return scalar_times_vectors(np.asarray(vt), scalar).tolist()
 
 
 def DrawPolyline(shape_path_str, pts_lst_lst):
@@ -340,13 +364,27 @@ def DrawPolyline(shape_path_str, pts_lst_lst):
     write_obj = shapefile.Writer(shapefile.POLYLINE)
     write_obj.autoBalance = 1
     write_obj.field('ID','C','10')
+    coords, offsets = ragged_coords(pts_lst_lst)
+    write_obj.polyArrays(coords, offsets, shapeType=3)
     for i,pts_lst in enumerate(pts_lst_lst):
-        write_obj.poly(shapeType=3, parts=[pts_lst])
         write_obj.record(str(i))
     write_obj.save(shape_path_str)
     return True
 
 
+def ragged_coords(pts_lst_lst):
+    """
+    converts a list of point lists into the flat vertex array and offsets used by shapefile.Writer.polyArrays
+    :param pts_lst_lst: [[[x11,y11,...],[x12,y12,...]],[[x21,y21,...],...]]
+    :return: coords: (n, 2) array of all vertices, offsets: index of the first vertex of each list followed by n
+    """
+    offsets = [0]
+    for pts_lst in pts_lst_lst:
+        offsets.append(offsets[-1] + len(pts_lst))
+    coords = np.array([pt[:2] for pts_lst in pts_lst_lst for pt in pts_lst], dtype=float).reshape(-1, 2)
+    return coords, offsets
+
+
 def deg_to_rad(phi):
     return phi*3.14159265358979323846/180.0
 
@@ -356,29 +394,19 @@ def vector(pt1, pt2):
     # it takes:
     # pt1, pt2 [list] = [x1,y1,z1,...], [x2,y2,z2,...]
     # return vt [list] = [a1,b1...]
-    vt = []
-    i=0
-    while i < min(len(pt1),len(pt2)):
-        vt.append(pt2[i]-pt1[i])
-        i+=1
-    return vt
+    n = min(len(pt1),len(pt2))
+    return vectors(np.asarray(pt1[:n]), np.asarray(pt2[:n])).tolist()
 
 
 def unit_vector(vt):
     # this function returns the unit vector of a vector
     # it takes:
     # vt [list] = [a1,b1,...n1]
-    sqsum = 0
-    uvt = []
-    for item in vt:
-        sqsum+=item*item
-    length = sqsum**0.5
-    if length == 0:
+    uvt = unit_vectors(np.asarray(vt, dtype=float))
+    if np.isnan(uvt).any():
         print("vt has coincident points")
         return False
-    for item in vt:
-        uvt.append(item/length)
-    return uvt
+    return uvt.tolist()
 
 
 def rot_vector(vt, phi):
@@ -388,9 +416,110 @@ def rot_vector(vt, phi):
     # phi [float] = the rotation angle in degrees (+phi left, -phi right)
     # it returns
     # the totated vector [list] = [xr1,yr1]
+    return rot_vectors(np.array(vt[:2], dtype=float), phi).tolist()
+
+
+# Vectorized 2D geometry kernel
+# The functions below work on whole arrays at once: points are (N, 2) arrays
+# (or a single (2,) point), segments and lines defined through two points are
+# (N, 2, 2) arrays (or a single (2, 2) line) and broadcast against each other.
+# The scalar functions above are thin wrappers around them.
+
+def vectors(pts1, pts2):
+    """
+    creates the vectors from pts1 to pts2
+    :param pts1: (N, 2) array of start points
+    :param pts2: (N, 2) array of end points
+    :return: (N, 2) array of vectors
+    """
+    return np.asarray(pts2) - np.asarray(pts1)
+
+
+def unit_vectors(vts):
+    """
+    scales vectors to length 1
+    :param vts: (N, 2) array of vectors
+    :return: (N, 2) array of unit vectors, NaN for vectors of length 0
+    """
+    vts = np.asarray(vts, dtype=float)
+    length = np.sqrt((vts * vts).sum(axis=-1, keepdims=True))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(length == 0, np.nan, vts / length)
+
+
+def rot_vectors(vts, phi):
+    """
+    rotates vectors by phi degrees (+phi left, -phi right)
+    :param vts: (N, 2) array of vectors
+    :param phi: the rotation angle in degrees, a float or an array of N angles
+    :return: (N, 2) array of rotated vectors
+    """
     import math
-    rot = [[math.cos(deg_to_rad(phi)),-math.sin(deg_to_rad(phi))],[math.sin(deg_to_rad(phi)),math.cos(deg_to_rad(phi))]] #rotation matrix for phi rotation left
-    return [rot[0][0]*vt[0]+rot[0][1]*vt[1],rot[1][0]*vt[0]+rot[1][1]*vt[1]]
+    vts = np.asarray(vts, dtype=float)
+    if np.ndim(phi) == 0:
+        rad = deg_to_rad(phi)  # computed once for all vectors
+        cos, sin = math.cos(rad), math.sin(rad)
+    else:
+        rad = deg_to_rad(np.asarray(phi, dtype=float))
+        cos, sin = np.cos(rad), np.sin(rad)
+    x, y = vts[..., 0], vts[..., 1]
+    return np.stack([cos*x-sin*y, sin*x+cos*y], axis=-1)
+
+
+def scalar_times_vectors(vts, scalars):
+    """
+    :param vts: (N, 2) array of vectors
+    :param scalars: a float or an array of N factors
+    :return: (N, 2) array of scaled vectors
+    """
+    scalars = np.asarray(scalars)
+    if scalars.ndim:
+        scalars = scalars[..., np.newaxis]
+    return scalars * np.asarray(vts)
+
+
+def move_pts_along_vectors(pts, vts, dists):
+    """
+    moves points along the direction of vectors by dists
+    :param pts: (N, 2) array of points, further columns (e.g. depths) are kept
+    :param vts: (N, 2) array of vectors, or a single vector for all points
+    :param dists: a float or an array of N distances
+    :return: array of moved points, same shape as pts
+    """
+    moved = np.array(pts, dtype=float)
+    moved[..., :2] += scalar_times_vectors(unit_vectors(vts), dists)
+    return moved
+
+
+def dist_pts_lns(pts, lns):
+    """
+    :param pts: (N, 2) array of points
+    :param lns: (N, 2, 2) array of lines, or a single (2, 2) line for all points
+    :return: (N,) array of distances between points and lines - lines extending unlimited
+    """
+    pts = np.asarray(pts, dtype=float)
+    lns = np.asarray(lns, dtype=float)
+    x0, y0 = pts[..., 0], pts[..., 1]
+    x1, y1, x2, y2 = lns[..., 0, 0], lns[..., 0, 1], lns[..., 1, 0], lns[..., 1, 1]
+    return abs((y2-y1)*x0-(x2-x1)*y0+x2*y1-y2*x1)/np.sqrt((y2-y1)**2+(x2-x1)**2)
+
+
+def intersect_pts_endless_lines(lns1, lns2):
+    """
+    finds the intersect points between pairs of lines that are indefinitely long
+    and defined through two points each
+    :param lns1: (N, 2, 2) array of lines [[x1,y1],[x2,y2]]
+    :param lns2: (N, 2, 2) array of lines [[x3,y3],[x4,y4]]
+    :return: (N, 2) array of intersect points, not finite for parallel lines
+    """
+    lns1 = np.asarray(lns1, dtype=float)
+    lns2 = np.asarray(lns2, dtype=float)
+    x1, y1, x2, y2 = lns1[..., 0, 0], lns1[..., 0, 1], lns1[..., 1, 0], lns1[..., 1, 1]
+    x3, y3, x4, y4 = lns2[..., 0, 0], lns2[..., 0, 1], lns2[..., 1, 0], lns2[..., 1, 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xi = ((x1*y2-y1*x2)*(x3-x4)-(x1-x2)*(x3*y4-y3*x4))/((x1-x2)*(y3-y4)-(y1-y2)*(x3-x4))
+        yi = ((x1*y2-y1*x2)*(y3-y4)-(y1-y2)*(x3*y4-y3*x4))/((x1-x2)*(y3-y4)-(y1-y2)*(x3-x4))
+    return np.stack([xi, yi], axis=-1)
 
 
 def perp_line(pt1, pt2, length):
@@ -420,19 +549,60 @@ def project_point(pt, src_epsg, tar_epsg, GDAL_version):
     :param tar_epsg: the target EPSG code
     :return: pt [x,y] transformed coordinates
     """
-    import ogr, osr
-    point = ogr.Geometry(ogr.wkbPoint)  # create a geometry from coordinates
-    if GDAL_version<=2.4:
-        point.AddPoint(pt[0], pt[1])
-    else:
-        point.AddPoint(pt[1], pt[0])
-    inSpatialRef = osr.SpatialReference()  # create coordinate transformation
-    inSpatialRef.ImportFromEPSG(src_epsg)
-    outSpatialRef = osr.SpatialReference()
-    outSpatialRef.ImportFromEPSG(tar_epsg)
-    coordTransform = osr.CoordinateTransformation(inSpatialRef, outSpatialRef)
-    point.Transform(coordTransform)  # transform point
-    return [point.GetX(), point.GetY()]
+    return get_transformer(src_epsg, tar_epsg, GDAL_version).project_point(pt)
+
+
+_transformers = {}
+
+
+def get_transformer(src_epsg, tar_epsg, GDAL_version):
+    """
+    returns the cached CoordinateTransformer for the EPSG codes and the axis order of the GDAL version,
+    creating it on first use
+    """
+    key = (src_epsg, tar_epsg, GDAL_version > 2.4)
+    if key not in _transformers:
+        _transformers[key] = CoordinateTransformer(src_epsg, tar_epsg, GDAL_version)
+    return _transformers[key]
+
+
+class CoordinateTransformer:
+    """
+    projects points from src_epsg to tar_epsg; the spatial references and the transformation are created once
+    - the axis order is handled here once: up to GDAL 2.4 points are passed as [x,y], newer versions expect
+      them as [y,x] (see project_point)
+    - project_points transforms a whole coordinate array with a single call
+    :param src_epsg: the source EPSG code
+    :param tar_epsg: the target EPSG code
+    :param GDAL_version: the version of GDAL as float, e.g. 2.4 or 3.0
+    """
+    def __init__(self, src_epsg, tar_epsg, GDAL_version):
+        import osr
+        inSpatialRef = osr.SpatialReference()
+        inSpatialRef.ImportFromEPSG(src_epsg)
+        outSpatialRef = osr.SpatialReference()
+        outSpatialRef.ImportFromEPSG(tar_epsg)
+        self.coordTransform = osr.CoordinateTransformation(inSpatialRef, outSpatialRef)
+        self.swap_axes = GDAL_version > 2.4
+
+    def project_points(self, pts):
+        """
+        :param pts: [[x1,y1,...],[x2,y2,...],...] or an (N, 2+) array in source coordinates
+        :return: (N, 2) array of transformed coordinates
+        """
+        xy = xy_array(pts)
+        if not len(xy):
+            return np.empty((0, 2))
+        if self.swap_axes:
+            xy = xy[:, ::-1]
+        return np.array(self.coordTransform.TransformPoints(xy.tolist()), dtype=float)[:, :2]
+
+    def project_point(self, pt):
+        """
+        :param pt: [x,y] in source coordinates
+        :return: pt [x,y] transformed coordinates
+        """
+        return self.project_points([pt]).tolist()[0]
 
 
 def middle_point(ptslists):
@@ -458,38 +628,136 @@ def get_raster_value_at_point(point, raster_file, neighbours, stats):
     # if neighbours == True, takes the neighbouring 8 cells and
     # returns the stats value = max, min, mean
     #
-    import gdal
-    import struct
-    src_ds = gdal.Open(raster_file)
-    gt = src_ds.GetGeoTransform()
-    rb = src_ds.GetRasterBand(1)
-    #no_data_val = rb.GetNoDataValue()
-    data_type_id = rb.DataType
-    raster_type = gdal.GetDataTypeName(data_type_id)
-    # Conversion between GDAL types and python pack types
-    data_types = {'Byte': 'B', 'UInt16': 'H', 'Int16': 'h', 'UInt32': 'I', 'Int32': 'i', 'Float32': 'f', 'Float64': 'd'}
-    nrows = src_ds.RasterYSize
-    xllcorner = gt[0]
-    yllcorner = gt[3] - gt[1] * src_ds.RasterYSize
-    cellsize = gt[1]
-    xloc = int((point[0] - xllcorner) / cellsize)  # the location (column number) of x from the left edge
-    yloc = int((nrows - (point[1] - yllcorner) / cellsize))  # the location (line number) of y from the upper edge
-    if not neighbours:
-        structval = rb.ReadRaster(xloc, yloc, 1, 1, buf_type=data_type_id)
-        val = struct.unpack(data_types[raster_type], structval)
-        return val[0]
-    else:
-        vals = []
-        for x in [-1,0,1]:
-            for y in [-1,0,1]:
-                structval = rb.ReadRaster(xloc+x, yloc+y, 1, 1, buf_type=data_type_id)
-                vals.append(struct.unpack(data_types[raster_type], structval)[0])
+    # cells with the nodata value of the raster are ignored, nan is returned
+    # if no valid cell is found; the raster stays open in a shared RasterSampler
+    #
+    global _raster_sampler
+    if _raster_sampler is None:
+        _raster_sampler = RasterSampler()
+    return _raster_sampler.sample(raster_file, [point], neighbours, stats)[0].item()
+
+
+_raster_sampler = None
+
+
+class RasterSampler:
+    """
+    samples raster values at many points at once
+    - keeps up to max_open rasters open, the least recently used one is closed first
+    - reads whole raster blocks and keeps up to max_blocks decoded blocks in memory (least recently used first out)
+    - the points of one call are grouped by block, so every block is read once and looked up vectorized
+    - cells with the nodata value of the band and cells outside of the raster are nan
+    :param max_open: maximum number of open rasters
+    :param max_blocks: maximum number of cached blocks
+    :param band: number of the raster band to sample
+    """
+    def __init__(self, max_open=8, max_blocks=256, band=1):
+        from collections import OrderedDict
+        self.max_open = max_open
+        self.max_blocks = max_blocks
+        self.band = band
+        self.rasters = OrderedDict()  # raster_file: (dataset, band, geotransform, size, block size, nodata)
+        self.blocks = OrderedDict()  # (raster_file, block column, block row): array
+
+    def open(self, raster_file):
+        """
+        returns the open dataset and the properties of a raster, opening it if needed
+        """
+        if raster_file in self.rasters:
+            self.rasters.move_to_end(raster_file)
+            return self.rasters[raster_file]
+        import gdal
+        src_ds = gdal.Open(raster_file)
+        if src_ds is None:
+            raise IOError('unable to open raster ' + str(raster_file))
+        rb = src_ds.GetRasterBand(self.band)
+        raster = (src_ds, rb, src_ds.GetGeoTransform(), (src_ds.RasterXSize, src_ds.RasterYSize),
+                  tuple(rb.GetBlockSize()), rb.GetNoDataValue())
+        self.rasters[raster_file] = raster
+        while len(self.rasters) > self.max_open:
+            self.rasters.popitem(last=False)  # releasing the last reference closes the dataset
+        return raster
+
+    def close(self):
+        """
+        closes all rasters and empties the block cache
+        """
+        self.rasters.clear()
+        self.blocks.clear()
+
+    def block(self, raster_file, bx, by):
+        """
+        returns block (bx, by) of a raster as a float array with nan for nodata
+        """
+        key = (raster_file, bx, by)
+        if key in self.blocks:
+            self.blocks.move_to_end(key)
+            return self.blocks[key]
+        src_ds, rb, gt, (ncols, nrows), (bw, bh), nodata = self.open(raster_file)
+        xoff, yoff = bx * bw, by * bh
+        values = rb.ReadAsArray(xoff, yoff, min(bw, ncols - xoff), min(bh, nrows - yoff)).astype(float)
+        if nodata is not None:
+            values[values == nodata] = np.nan
+        self.blocks[key] = values
+        while len(self.blocks) > self.max_blocks:
+            self.blocks.popitem(last=False)
+        return values
+
+    def cells(self, raster_file, points):
+        """
+        :param points: [[x1,y1,...],[x2,y2,...],...] or an (N, 2+) array in the coordinate system of the raster
+        :return: cols, rows: (N,) int arrays of the cells containing the points
+        """
+        gt = self.open(raster_file)[2]
+        xy = xy_array(points)
+        cols = np.floor((xy[:, 0] - gt[0]) / gt[1]).astype(np.int64)
+        rows = np.floor((xy[:, 1] - gt[3]) / gt[5]).astype(np.int64)
+        return cols, rows
+
+    def values(self, raster_file, cols, rows):
+        """
+        :param cols, rows: int arrays of cell locations, any shape
+        :return: float array of the cell values, nan for nodata and cells outside of the raster
+        """
+        (ncols, nrows), (bw, bh) = self.open(raster_file)[3:5]
+        result = np.full(np.shape(cols), np.nan)
+        cols, rows, flat = np.ravel(cols), np.ravel(rows), result.reshape(-1)
+        inside = np.flatnonzero((cols >= 0) & (cols < ncols) & (rows >= 0) & (rows < nrows))
+        bxs, bys = cols[inside] // bw, rows[inside] // bh
+        keys, groups = np.unique(bys * ((ncols + bw - 1) // bw) + bxs, return_inverse=True)
+        order = np.argsort(groups, kind='stable')
+        bounds = np.searchsorted(groups[order], np.arange(len(keys) + 1))
+        for k in range(len(keys)):
+            sel = inside[order[bounds[k]:bounds[k + 1]]]
+            bx, by = cols[sel[0]] // bw, rows[sel[0]] // bh
+            values = self.block(raster_file, int(bx), int(by))
+            flat[sel] = values[rows[sel] - by * bh, cols[sel] - bx * bw]
+        return result
+
+    def sample(self, raster_file, points, neighbours=False, stats='mean'):
+        """
+        samples the raster at many points in one call
+        :param raster_file: path of the raster
+        :param points: [[x1,y1,...],[x2,y2,...],...] or an (N, 2+) array in the coordinate system of the raster
+        :param neighbours: if True, the stats value of the cell and its 8 neighbours is returned
+        :param stats: 'min', 'max' or 'mean' of the valid cells in neighbour mode
+        :return: (N,) float array, nan where no valid cell is found
+        """
+        cols, rows = self.cells(raster_file, points)
+        if not neighbours:
+            return self.values(raster_file, cols, rows)
+        dx, dy = np.meshgrid([-1, 0, 1], [-1, 0, 1])
+        window = self.values(raster_file, cols[:, None] + dx.ravel(), rows[:, None] + dy.ravel())  # (N, 9)
         if stats == 'min':
-            return min(vals)
+            return np.fmin.reduce(window, axis=1)
         elif stats == 'max':
-            return max(vals)
+            return np.fmax.reduce(window, axis=1)
         elif stats == 'mean':
-            return sum(vals)/len(vals)
+            valid = ~np.isnan(window)
+            count = valid.sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return np.where(count > 0, np.where(valid, window, 0).sum(axis=1) / count, np.nan)
+        raise ValueError("stats must be 'min', 'max' or 'mean'")
 
 
 def interpolate_no_data_values(values, nodata):
@@ -622,17 +890,19 @@ def shape_to_points(file_path_str, extract_field_nr_int):
 		it returns
 		shapes_lst_lst_lst = a list with depth 3
 	"""
-	sf = shapefile.Reader(file_path_str)
+	sf = shapefile.Reader(file_path_str, binaryCache=True) #decoded arrays are cached in a .shpcache file next to the shapefile
 	shapes = sf.shapes()
-	records = sf.records()
+	if not (extract_field_nr_int is None or extract_field_nr_int == ''):
+		field_name = sf.fields[extract_field_nr_int + 1][0] #sf.fields starts with the deletion flag
+		column = sf.columns([field_name])[0][field_name] #decodes only the requested field, in one pass
 	shapes_lst_lst_lst = []
 	for shape_id,shape in enumerate(shapes): #each record
 		points_record_lst_lst = [] #[[x1, y1, rec1], [...]]
 		if extract_field_nr_int is None or extract_field_nr_int == '':
 			record_value = None
 		else:
-			record_value = int(records[shape_id][extract_field_nr_int])
-		for pt_id_int,point in enumerate(shape.points): #loop over all points in the current shape
+			record_value = int(column[shape_id])
+		for pt_id_int,point in enumerate(shape.points.tolist()): #loop over all points in the current shape
 			if record_value is None:
 				points_record_lst_lst.append([point[0], point[1]])
 			else:
@@ -674,7 +944,7 @@ def read_raw_xs(fp, src_epsg, tar_epsg, GDAL_version):
     and populates the data that can be derived from the xs files
     :return:
     """
-    points = []
+    points_lonlat, depths = [], []
     with open(fp, 'r') as xs_read:
         for aline in xs_read:
             if aline.startswith('Dist left bank'):
@@ -686,13 +956,13 @@ def read_raw_xs(fp, src_epsg, tar_epsg, GDAL_version):
             elif aline.startswith('lat,lon'):
                 continue
             else:
-                point_lonlat = [float(aline.split(',')[1]),float(aline.split(',')[0])]
-                point_xyd = project_point(point_lonlat, src_epsg, tar_epsg, GDAL_version)
-                depth = float(aline.split(',')[2])
-                point_xyd.append(depth)
-                points.append(point_xyd)
-        mp = middle_point(points)
-        return lft_bank_dist, rgt_bank_dist, bank_height, points
+                points_lonlat.append([float(aline.split(',')[1]),float(aline.split(',')[0])])
+                depths.append(float(aline.split(',')[2]))
+    # all points of the file are projected in one call
+    points_xy = get_transformer(src_epsg, tar_epsg, GDAL_version).project_points(points_lonlat).tolist()
+    points = [point_xy + [depth] for point_xy, depth in zip(points_xy, depths)]
+    mp = middle_point(points)
+    return lft_bank_dist, rgt_bank_dist, bank_height, points
 
 
 if __name__ == "__main__":
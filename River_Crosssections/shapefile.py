@@ -9,12 +9,25 @@
 
 __version__ = "1.2.0"
 
-from struct import pack, unpack, calcsize, error
+from struct import pack, unpack, unpack_from, calcsize, error
 import os
 import sys
 import time
 import array
+import hashlib
+import json
+import logging
+import math
+import operator
+import mmap
 import tempfile
+import zipfile
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 #
 # Constants for shape types
@@ -74,6 +87,10 @@ def is_string(v):
     else:
         return isinstance(v, basestring)
 
+def _isArray(v):
+    """Tests if v is a NumPy array (False if numpy is not installed)."""
+    return np is not None and isinstance(v, np.ndarray)
+
 class _Array(array.array):
     """Converts python tuples to lits of the appropritate type.
     Used to unpack different shapefile header parts."""
@@ -90,6 +107,49 @@ def signed_area(coords):
     ys.append(ys[1])
     return sum(xs[i]*(ys[i+1]-ys[i-1]) for i in range(1, len(coords)))/2.0
 
+def _decodeColumn(raw, fieldType, deci):
+    """Converts a column of raw fixed-width dbf values (a NumPy bytes
+    array) into a typed NumPy array."""
+    if fieldType in ("N", "F"):
+        values = np.char.strip(np.char.replace(raw, b("\0"), b("")))
+        blank = values == b("")
+        if fieldType == "N" and not deci:
+            try:
+                return np.where(blank, b("0"), values).astype(np.int64)
+            except (ValueError, OverflowError):
+                # Values beyond the int64 range fall back to float64
+                pass
+        try:
+            return np.where(blank, b("nan"), values).astype(np.float64)
+        except ValueError:
+            # Overflow markers like '****' are treated as missing values
+            column = np.empty(len(values))
+            for i, value in enumerate(values):
+                try:
+                    column[i] = float(value)
+                except ValueError:
+                    column[i] = np.nan
+            return column
+    elif fieldType == "D" and raw.dtype.itemsize == 8:
+        digits = np.ascontiguousarray(raw).view(np.uint8).reshape(-1, 8).astype(np.int64) - 48
+        valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+        year = digits[:, :4].dot([1000, 100, 10, 1])
+        month = digits[:, 4:6].dot([10, 1])
+        day = digits[:, 6:8].dot([10, 1])
+        valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+        year, month, day = [np.where(valid, v, d) for v, d in ((year, 1970), (month, 1), (day, 1))]
+        dates = (year - 1970).astype("datetime64[Y]").astype("datetime64[M]") + (month - 1)
+        dates = dates.astype("datetime64[D]") + (day - 1)
+        dates[~valid] = np.datetime64("NaT")
+        return dates
+    elif fieldType == "L":
+        column = np.full(len(raw), b("?"), dtype="S1")
+        first = np.char.strip(raw).astype("S1")
+        column[np.isin(first, [b(c) for c in "YyTt"])] = b("T")
+        column[np.isin(first, [b(c) for c in "NnFf"])] = b("F")
+        return column
+    return np.char.decode(np.char.strip(raw), "utf-8")
+
 class _Shape:
     def __init__(self, shapeType=None):
         """Stores the geometry of the different shape types
@@ -186,6 +246,542 @@ class ShapefileException(Exception):
     """An exception to handle shapefile specific problems."""
     pass
 
+class _SpatialIndex:
+    """A packed R-tree over the bounding boxes of the geometry records.
+    The record boxes are ordered with the Sort-Tile-Recursive algorithm and
+    stored as the lowest level, every following level holds one box per
+    group of nodeSize consecutive entries of the level below. The index can
+    be persisted to a sidecar file that is tagged with the size and
+    modification time of the .shp file it was built from."""
+    magic = b("PYSHPRTX")
+    header = "<8sIIqdII"
+
+    def __init__(self, ids, levels, nodeSize=16):
+        self.ids = ids
+        self.levels = levels
+        self.nodeSize = nodeSize
+
+    @classmethod
+    def build(cls, boxes, nodeSize=16):
+        """Builds the tree from a list of (record index, bbox) tuples."""
+        boxes = sorted(boxes, key=lambda e: e[1][0] + e[1][2])
+        numNodes = -(-len(boxes) // nodeSize)
+        sliceSize = nodeSize * max(1, int(math.ceil(math.sqrt(numNodes))))
+        ordered = []
+        for k in range(0, len(boxes), sliceSize):
+            ordered.extend(sorted(boxes[k:k + sliceSize], key=lambda e: e[1][1] + e[1][3]))
+        ids = array.array("i", [e[0] for e in ordered])
+        level = array.array("d")
+        for e in ordered:
+            level.extend(e[1])
+        levels = [level]
+        while len(level) > 4 * nodeSize:
+            parent = array.array("d")
+            step = 4 * nodeSize
+            for k in range(0, len(level), step):
+                group = level[k:k + step]
+                parent.extend((min(group[0::4]), min(group[1::4]),
+                               max(group[2::4]), max(group[3::4])))
+            levels.append(parent)
+            level = parent
+        return cls(ids, levels, nodeSize)
+
+    def query(self, bbox):
+        """Returns the sorted indices of all records whose bounding box
+        intersects bbox [xmin, ymin, xmax, ymax]."""
+        xmin, ymin, xmax, ymax = bbox
+        depth = len(self.levels) - 1
+        candidates = range(len(self.levels[-1]) // 4)
+        while True:
+            level = self.levels[depth]
+            hits = [j for j in candidates
+                    if level[4*j] <= xmax and level[4*j+2] >= xmin
+                    and level[4*j+1] <= ymax and level[4*j+3] >= ymin]
+            if depth == 0:
+                return sorted(self.ids[j] for j in hits)
+            depth -= 1
+            size = len(self.levels[depth]) // 4
+            candidates = [k for j in hits
+                          for k in range(j * self.nodeSize, min((j + 1) * self.nodeSize, size))]
+
+    def save(self, path, shpSize, shpMtime):
+        """Writes the index to a sidecar file."""
+        arrays = [self.ids] + self.levels
+        if sys.byteorder != "little":
+            arrays = [array.array(a.typecode, a) for a in arrays]
+            [a.byteswap() for a in arrays]
+        with open(path, "wb") as f:
+            f.write(pack(self.header, self.magic, 1, self.nodeSize, shpSize,
+                         shpMtime, len(self.ids), len(self.levels)))
+            f.write(pack("<%dI" % len(self.levels), *[len(l) for l in self.levels]))
+            for a in arrays:
+                if PYTHON3:
+                    f.write(a.tobytes())
+                else:
+                    f.write(a.tostring())
+
+    @classmethod
+    def load(cls, path, shpSize, shpMtime):
+        """Reads an index from a sidecar file. Returns None if the file is
+        missing, unreadable or does not match the given .shp size and
+        modification time."""
+        try:
+            with open(path, "rb") as f:
+                (magic, version, nodeSize, size, mtime, numIds, numLevels) = \
+                        unpack(cls.header, f.read(calcsize(cls.header)))
+                if magic != cls.magic or version != 1 or size != shpSize or mtime != shpMtime:
+                    return None
+                sizes = unpack("<%dI" % numLevels, f.read(4 * numLevels))
+                ids = array.array("i")
+                levels = [array.array("d") for n in sizes]
+                if PYTHON3:
+                    ids.frombytes(f.read(4 * numIds))
+                    [level.frombytes(f.read(8 * n)) for level, n in zip(levels, sizes)]
+                else:
+                    ids.fromstring(f.read(4 * numIds))
+                    [level.fromstring(f.read(8 * n)) for level, n in zip(levels, sizes)]
+        except (EnvironmentError, error, ValueError):
+            return None
+        if sys.byteorder != "little":
+            [a.byteswap() for a in [ids] + levels]
+        return cls(ids, levels, nodeSize)
+
+class _BinaryCache:
+    """A cache of the decoded geometry and attribute arrays of a shapefile
+    stored in a single binary file next to it. The file starts with a JSON
+    header that describes the arrays and identifies the source files by
+    size, modification time and a hash of their first and last 64 KiB. The
+    arrays follow at 64 byte aligned offsets and are loaded as read-only
+    views into a memory map of the file."""
+    magic = b("PYSHPBC1")
+    align = 64
+
+    @staticmethod
+    def key(shapeName):
+        """Identifies the current state of the .shp, .shx and .dbf files."""
+        key = []
+        for ext in ("shp", "shx", "dbf"):
+            path = "%s.%s" % (shapeName, ext)
+            if not os.path.isfile(path):
+                key.append(None)
+                continue
+            stat = os.stat(path)
+            digest = hashlib.sha1()
+            with open(path, "rb") as f:
+                digest.update(f.read(65536))
+                if stat.st_size > 65536:
+                    f.seek(max(65536, stat.st_size - 65536))
+                    digest.update(f.read())
+            key.append([stat.st_size, stat.st_mtime, digest.hexdigest()])
+        return key
+
+    @classmethod
+    def save(cls, path, key, arrays):
+        """Writes the arrays to the cache file, replacing it atomically."""
+        entries = []
+        offset = 0
+        for name, value in arrays.items():
+            value = np.ascontiguousarray(value)
+            entries.append({"name": name, "dtype": value.dtype.str,
+                            "shape": list(value.shape), "offset": offset})
+            offset += -(-value.nbytes // cls.align) * cls.align
+        header = b(json.dumps({"key": key, "arrays": entries}))
+        start = -(-(len(cls.magic) + 4 + len(header)) // cls.align) * cls.align
+        temp = "%s.%d.tmp" % (path, os.getpid())
+        with open(temp, "wb") as f:
+            f.write(cls.magic + pack("<I", len(header)) + header)
+            for entry, value in zip(entries, arrays.values()):
+                f.seek(start + entry["offset"])
+                f.write(np.ascontiguousarray(value).tobytes())
+            f.truncate(start + offset)
+        os.replace(temp, path)
+
+    @classmethod
+    def load(cls, path, key):
+        """Maps a cache file and returns its arrays, or None if the file
+        is missing, unreadable or was built from other source files."""
+        try:
+            with open(path, "rb") as f:
+                if f.read(len(cls.magic)) != cls.magic:
+                    return None
+                size = unpack("<I", f.read(4))[0]
+                header = json.loads(u(f.read(size)))
+                if header["key"] != key:
+                    return None
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (EnvironmentError, error, ValueError, KeyError):
+            return None
+        start = -(-(len(cls.magic) + 4 + size) // cls.align) * cls.align
+        arrays = {}
+        for entry in header["arrays"]:
+            dtype = np.dtype(entry["dtype"])
+            count = int(np.prod(entry["shape"]))
+            arrays[entry["name"]] = np.frombuffer(mapped, dtype, count,
+                    start + entry["offset"]).reshape(entry["shape"])
+        return arrays
+
+def _ringAreas(points, starts):
+    """Returns the signed areas of the rings starting at the indices starts
+    of one (N, 2) coordinate array, computed vectorized. A value >= 0
+    indicates a counter-clockwise oriented ring, as for signed_area()."""
+    x, y = points[:, 0], points[:, 1]
+    cross = np.append(x[:-1] * y[1:] - x[1:] * y[:-1], 0.0)
+    # Drop the terms that connect the last vertex of a ring to the next ring
+    cross[np.append(starts[1:], len(points)) - 1] = 0.0
+    return np.add.reduceat(cross, starts) / 2.0
+
+def _jsonCoords(points):
+    """Formats an (N, 2) coordinate array as a GeoJSON position list."""
+    return "[%s]" % ",".join(["[%r,%r]" % (x, y) for x, y in points.tolist()])
+
+def _jsonGeometry(shape):
+    """Formats an array backed shape as a GeoJSON geometry, following the
+    same rules as _Shape.__geo_interface__."""
+    shapeType = shape.shapeType
+    points = shape.points
+    if shapeType == NULL or not len(points):
+        return "null"
+    if shapeType in (POINT, POINTM, POINTZ):
+        return '{"type": "Point", "coordinates": [%r,%r]}' % tuple(points[0].tolist())
+    if shapeType in (MULTIPOINT, MULTIPOINTM, MULTIPOINTZ):
+        return '{"type": "MultiPoint", "coordinates": %s}' % _jsonCoords(points)
+    starts = np.asarray(shape.parts, dtype=np.int64)
+    rings = np.split(points, starts[1:])
+    if shapeType in (POLYLINE, POLYLINEM, POLYLINEZ):
+        if len(rings) == 1:
+            return '{"type": "LineString", "coordinates": %s}' % _jsonCoords(points)
+        return '{"type": "MultiLineString", "coordinates": [%s]}' % \
+                ",".join([_jsonCoords(ring) for ring in rings])
+    # Polygons: clockwise rings start a new polygon, the others are holes
+    polys = []
+    for ring, area in zip(rings, _ringAreas(points, starts).tolist()):
+        if area < 0 or not polys:
+            polys.append([])
+        polys[-1].append(_jsonCoords(ring))
+    if len(polys) == 1:
+        return '{"type": "Polygon", "coordinates": [%s]}' % ",".join(polys[0])
+    return '{"type": "MultiPolygon", "coordinates": [%s]}' % \
+            ",".join(["[%s]" % ",".join(poly) for poly in polys])
+
+def _jsonValue(value):
+    """Converts attribute values json cannot serialize."""
+    if isinstance(value, bytes):
+        return u(value).strip() or None
+    raise TypeError("%r is not JSON serializable" % value)
+
+# Comparison operators understood in where clauses
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, target: value in target,
+    "between": lambda value, target: target[0] <= value <= target[1],
+    }
+
+def _whereConditions(where):
+    """Normalizes a where clause into a list of (field, operator, value)
+    tuples. A dictionary maps field names to a value (equality) or to a
+    list, tuple or set of values (membership)."""
+    if isinstance(where, dict):
+        conditions = []
+        for name, value in where.items():
+            if isinstance(value, (list, tuple, set)):
+                conditions.append((name, "in", value))
+            else:
+                conditions.append((name, "==", value))
+    else:
+        conditions = list(where)
+    for name, op, value in conditions:
+        if op not in _OPERATORS:
+            raise ShapefileException("Unknown operator %s in where clause." % op)
+    return conditions
+
+def _test(value, op, target):
+    """Applies a where clause operator, missing values never match."""
+    if value is None:
+        return False
+    try:
+        return _OPERATORS[op](value, target)
+    except TypeError:
+        return False
+
+def _rawNumber(raw):
+    """Decodes a raw numeric dbf value, None if it is blank or invalid."""
+    try:
+        return float(raw.replace(b("\0"), b("")))
+    except ValueError:
+        return None
+
+def _rawLogical(raw):
+    """Decodes a raw logical dbf value to 'T', 'F' or '?'."""
+    raw = raw.strip()[:1]
+    return (raw and raw in b("YyTt") and "T") or (raw and raw in b("NnFf") and "F") or "?"
+
+def _rawText(raw):
+    """Decodes a raw character dbf value."""
+    return u(raw).strip()
+
+def _textTarget(op, value):
+    """Converts the value of a where clause on a character field to str,
+    so that e.g. 5 matches the text 5."""
+    if op == "in":
+        return set(str(v) for v in value)
+    if op == "between":
+        return (str(value[0]), str(value[1]))
+    return str(value)
+
+def _textValue(value):
+    """Converts a decoded character field value to stripped str."""
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        return _rawText(value)
+    return str(value).strip()
+
+def _compileWhere(fields, where):
+    """Compiles a where clause into a function that tests a raw dbf record
+    row. Only the byte slices of the fields used in the clause are looked at
+    and equality tests on character fields compare the bytes directly."""
+    slices = {}
+    offset = 0
+    for (name, typ, size, deci) in fields:
+        slices[name] = (offset, offset + int(size), typ)
+        offset += int(size)
+    tests = []
+    for name, op, value in _whereConditions(where):
+        if name not in slices:
+            raise ShapefileException("Unknown field %s in where clause." % name)
+        start, end, typ = slices[name]
+        if typ in ("N", "F"):
+            decode = _rawNumber
+        elif typ == "L":
+            decode = _rawLogical
+        else:
+            value = _textTarget(op, value)
+            if op in ("==", "in"):
+                targets = set(b(v) for v in (value if op == "in" else [value]))
+                tests.append(lambda row, s=start, e=end, t=targets: row[s:e].strip() in t)
+                continue
+            decode = _rawText
+        tests.append(lambda row, s=start, e=end, d=decode, o=op, v=value: _test(d(row[s:e]), o, v))
+    return lambda row: all(t(row) for t in tests)
+
+def _shapeSize(shape):
+    """Estimates the memory used by a decoded shape in bytes."""
+    size = 200
+    for name in ("points", "parts", "partTypes", "bbox", "z", "m"):
+        value = getattr(shape, name, None)
+        if value is None:
+            continue
+        if _isArray(value):
+            size += value.nbytes
+        elif name == "points" and len(value):
+            size += len(value) * (sys.getsizeof(value[0]) + 8)
+        else:
+            size += sys.getsizeof(value)
+    return size
+
+def _concatRanges(ranges):
+    """Joins the dictionaries returned by Reader.readRange() for
+    consecutive record ranges into one."""
+    result = {}
+    partOffsets, featureOffsets = [], []
+    numVertices = numParts = 0
+    for r in ranges:
+        partOffsets.append(r["partOffsets"][:-1] + numVertices)
+        featureOffsets.append(r["featureOffsets"][:-1] + numParts)
+        numVertices += len(r["coords"])
+        numParts += len(r["partOffsets"]) - 1
+    result["partOffsets"] = np.concatenate(partOffsets + [[numVertices]]).astype(np.int64)
+    result["featureOffsets"] = np.concatenate(featureOffsets + [[numParts]]).astype(np.int64)
+    for key in ranges[0]:
+        if key not in result:
+            result[key] = np.concatenate([r[key] for r in ranges])
+    return result
+
+# Timer of the I/O statistics
+_clock = getattr(time, "perf_counter", time.time)
+
+def _newStats(files, timeKey):
+    """Returns the empty I/O statistics of a Reader or Writer: call, byte
+    and seek counts and I/O time per file plus the time spent decoding or
+    encoding, in total, per shape type and for the dbf records."""
+    stats = dict((name, {"reads": 0, "writes": 0, "bytes": 0, "seeks": 0, "ioTime": 0.0})
+                 for name in files)
+    stats[timeKey] = 0.0
+    stats["shapeTypes"] = {}
+    stats["records"] = {"records": 0, timeKey: 0.0}
+    return stats
+
+def _countShape(stats, timeKey, counters, handler, *args):
+    """Calls handler, which reads or writes one geometry record and returns
+    the shape or the record offset and length, and adds the time spent
+    outside of file calls and the bytes transferred to the statistics of
+    the shape type."""
+    start, ioTime, transferred = _clock(), counters["ioTime"], counters["bytes"]
+    result = handler(*args)
+    elapsed = _clock() - start - (counters["ioTime"] - ioTime)
+    shapeType = args[1].shapeType if len(args) > 1 else result.shapeType
+    entry = stats["shapeTypes"].setdefault(shapeType, {"shapes": 0, "bytes": 0, timeKey: 0.0})
+    entry["shapes"] += 1
+    entry["bytes"] += counters["bytes"] - transferred
+    entry[timeKey] += elapsed
+    stats[timeKey] += elapsed
+    return result
+
+def _logStats(name, stats, logger, level):
+    """Logs I/O statistics as one line of JSON."""
+    logger = logger or logging.getLogger("shapefile")
+    logger.log(level, "I/O statistics of %s: %s", name, json.dumps(stats, sort_keys=True))
+
+class _CountingFile:
+    """Wraps a file object and counts the read, write and seek calls made
+    through it, the bytes transferred and the time spent in the calls. The
+    counters are a dictionary of the stats of a Reader or Writer. Seeks
+    that do not move the file position are not counted."""
+    def __init__(self, f, counters):
+        self.f = f
+        self.counters = counters
+
+    def __timed(self, func, *args):
+        start = _clock()
+        try:
+            return func(*args)
+        finally:
+            self.counters["ioTime"] += _clock() - start
+
+    def read(self, size=-1):
+        return self.readWith(lambda f: f.read(size))
+
+    def readWith(self, read):
+        """Counts a read done by a function of the wrapped file object."""
+        data = self.__timed(read, self.f)
+        self.counters["reads"] += 1
+        self.counters["bytes"] += len(data)
+        return data
+
+    def write(self, data):
+        self.__timed(self.f.write, data)
+        self.counters["writes"] += 1
+        self.counters["bytes"] += len(data)
+
+    def seek(self, offset, whence=0):
+        if whence or offset != self.f.tell():
+            self.counters["seeks"] += 1
+        return self.__timed(self.f.seek, offset, whence)
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+def _hilbertIndex(x, y, order=16):
+    """Returns the position of the cell (x, y) along a Hilbert curve that
+    fills a grid of 2**order by 2**order cells."""
+    n = 1 << order
+    d = 0
+    s = n >> 1
+    while s:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        if not ry:
+            if rx:
+                x, y = n - 1 - x, n - 1 - y
+            x, y = y, x
+        s >>= 1
+    return d
+
+def _splitZipPath(path):
+    """Splits a path of the form archive.zip!/folder/layer.shp into the
+    archive and the member path. Returns None for ordinary paths."""
+    archive, sep, member = path.partition("!")
+    if not archive.lower().endswith(".zip"):
+        return None
+    return archive, member.lstrip("/")
+
+class _ZipMemberView:
+    """Read-only, seekable file object over a member stored uncompressed in
+    a zip archive. Reads go straight to the byte range of the member in the
+    archive, so nothing is extracted or copied up front."""
+    def __init__(self, archive, info):
+        self.name = "%s!/%s" % (archive, info.filename)
+        self.__f = open(archive, "rb")
+        # The local file header may carry a different extra field than the
+        # central directory entry, so its length is read from the header
+        self.__f.seek(info.header_offset + 26)
+        nameLength, extraLength = unpack("<2H", self.__f.read(4))
+        self.__start = info.header_offset + 30 + nameLength + extraLength
+        self.__size = info.file_size
+        self.__pos = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0 or self.__pos + size > self.__size:
+            size = max(self.__size - self.__pos, 0)
+        self.__f.seek(self.__start + self.__pos)
+        data = self.__f.read(size)
+        self.__pos += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.__pos
+        elif whence == 2:
+            offset += self.__size
+        if offset < 0:
+            raise ValueError("Negative seek position %d" % offset)
+        self.__pos = offset
+        return offset
+
+    def tell(self):
+        return self.__pos
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        self.__f.close()
+
+def _openZipMembers(path):
+    """Opens the .shp, .shx and .dbf members of a shapefile inside a zip
+    archive. The member may be given with or without extension, or left out
+    if the archive holds a single shapefile. Stored members are returned as
+    seekable views into the archive, deflated members as buffered
+    decompressing streams that are cheap to read forward (seeking backward
+    restarts the decompression). Missing sidecar files are returned as None."""
+    archive, member = _splitZipPath(path)
+    try:
+        z = zipfile.ZipFile(archive)
+    except (IOError, zipfile.BadZipfile):
+        raise ShapefileException("Unable to open %s" % archive)
+    try:
+        infos = dict((info.filename.lower(), info) for info in z.infolist())
+        base = os.path.splitext(member)[0] if member else ""
+        if not base:
+            layers = [name for name in infos if name.endswith(".shp")]
+            if len(layers) != 1:
+                raise ShapefileException("%s contains %d shapefiles, name one as %s!/<layer>.shp" %
+                                         (archive, len(layers), archive))
+            base = infos[layers[0]].filename[:-4]
+        files = []
+        for ext in ("shp", "shx", "dbf"):
+            info = infos.get(("%s.%s" % (base, ext)).lower())
+            if info is None:
+                files.append(None)
+            elif info.compress_type == zipfile.ZIP_STORED:
+                files.append(_ZipMemberView(archive, info))
+            else:
+                files.append(z.open(info))
+        return ["%s!/%s" % (archive, base)] + files
+    finally:
+        # Opened members keep their own reference to the archive
+        z.close()
+
+def _readRange(shapeName, start, stop, memoryMapped):
+    """Decodes a record range in a worker process of Reader.read_parallel()."""
+    return Reader(shapeName, mmap=memoryMapped).readRange(start, stop)
+
 class Reader:
     """Reads the three files of a shapefile as a unit or
     separately.  If one of the three files (.shp, .shx,
@@ -203,17 +799,62 @@ class Reader:
     within each file is only accessed when required and as
     efficiently as possible. Shapefiles are usually not large
     but they can be.
+
+    Passing arrays=True decodes each geometry record with a single
+    read into NumPy arrays instead of per-vertex lists (requires numpy).
+    Reader.query() answers bounding box queries through a packed R-tree
+    that is stored next to the shapefile with the extension .rtx and rebuilt
+    whenever the .shp file changes.
+
+    Passing mmap=True maps the three files into memory once and returns
+    shapes as read-only array views into the mapping, so several processes
+    reading the same shapefile share the operating system page cache.
+
+    Passing cacheSize=<bytes> keeps recently used shapes returned by
+    shape() in a least recently used cache limited to roughly that many
+    bytes. Cached shapes are shared between calls, so modifying one modifies
+    the cached copy. cacheStats counts the hits, misses and evictions.
+
+    Passing binaryCache=True serves shapes(), readRange() and columns() from
+    a binary cache file with the extension .shpcache next to the shapefile.
+    It is built on first use, memory mapped on later loads and rebuilt
+    whenever one of the .shp, .shx or .dbf files changes (requires numpy).
+
+    Shapefiles inside zip archives are read without extracting them by
+    passing a path like "archive.zip!/folder/layer.shp", or just
+    "archive.zip" if the archive holds a single shapefile.
+
+    Passing stats=True counts the reads, bytes and seeks on each file and
+    the time spent in them, and the time spent decoding shapes (in total
+    and per shape type) and records. The counters are kept in the stats
+    dictionary and can be logged with logStats().
     """
     def __init__(self, *args, **kwargs):
         self.shp = None
         self.shx = None
         self.dbf = None
         self.shapeName = "Not specified"
-        self._offsets = []
+        self._offsets = None
+        self._lengths = None
         self.shpLength = None
         self.numRecords = None
         self.fields = []
         self.__dbfHdrLength = 0
+        self.__spatialIndex = None
+        self.__slices = None
+        self.__recFmt = None
+        self.memoryMapped = kwargs.get("mmap", False)
+        self.arrays = kwargs.get("arrays", False) or self.memoryMapped
+        if self.arrays and np is None:
+            raise ShapefileException("Array decoding requires numpy.")
+        self.binaryCache = kwargs.get("binaryCache", False)
+        self.__binaryArrays = None
+        if self.binaryCache and np is None:
+            raise ShapefileException("The binary cache requires numpy.")
+        self.cacheSize = kwargs.get("cacheSize", 0)
+        self.cacheStats = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+        self.__cache = OrderedDict()
+        self.stats = _newStats(("shp", "shx", "dbf"), "decodeTime") if kwargs.get("stats") else None
         # See if a shapefile name was passed as an argument
         if len(args) > 0:
             if is_string(args[0]):
@@ -244,7 +885,11 @@ class Reader:
         object. Normally this method would be called by the
         constructor with the file object or file name as an
         argument."""
-        if shapefile:
+        if shapefile and _splitZipPath(shapefile):
+            self.shapeName, self.shp, self.shx, self.dbf = _openZipMembers(shapefile)
+            if not self.shp and not self.dbf:
+                raise ShapefileException("Unable to open %s" % shapefile)
+        elif shapefile:
             (shapeName, ext) = os.path.splitext(shapefile)
             self.shapeName = shapeName
             try:
@@ -259,10 +904,58 @@ class Reader:
                 self.dbf = open("%s.dbf" % shapeName, "rb")
             except IOError:
                 raise ShapefileException("Unable to open %s.dbf" % shapeName)
+        if self.memoryMapped:
+            self.shp = self.__mapFile(self.shp)
+            self.shx = self.__mapFile(self.shx)
+            self.dbf = self.__mapFile(self.dbf)
+        if self.stats is not None:
+            self.shp = self.__countIO(self.shp, "shp")
+            self.shx = self.__countIO(self.shx, "shx")
+            self.dbf = self.__countIO(self.dbf, "dbf")
         if self.shp:
             self.__shpHeader()
         if self.dbf:
             self.__dbfHeader()
+        if self.shx and self._offsets is None:
+            self.__shxIndex()
+
+    def __countIO(self, f, name):
+        """Wraps a file object to count the I/O on it."""
+        if not f or isinstance(f, _CountingFile):
+            return f
+        return _CountingFile(f, self.stats[name])
+
+    def logStats(self, logger=None, level=logging.INFO):
+        """Logs the I/O statistics, by default to the 'shapefile' logger.
+        Requires a Reader created with stats=True."""
+        if self.stats is None:
+            raise ShapefileException("I/O statistics require a Reader created with stats=True.")
+        _logStats(self.shapeName, self.stats, logger, level)
+
+    def __mapFile(self, f):
+        """Replaces a file object with a read-only memory map of the same
+        file. Objects without a file descriptor (or empty files) are returned
+        unchanged."""
+        if not f or isinstance(f, (mmap.mmap, _CountingFile)):
+            return f
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, EnvironmentError, ValueError):
+            return f
+        f.close()
+        return mapped
+
+    def __read(self, f, size):
+        """Reads size bytes from a file object. For memory mapped files a
+        memoryview into the mapping is returned instead of a copy."""
+        if isinstance(f, _CountingFile):
+            return f.readWith(lambda raw: self.__read(raw, size))
+        if isinstance(f, mmap.mmap):
+            start = f.tell()
+            end = min(start + size, len(f))
+            f.seek(end)
+            return memoryview(f)[start:end]
+        return f.read(size)
 
     def __getFileObj(self, f):
         """Checks to see if the requested shapefile file object is
@@ -305,6 +998,20 @@ class Reader:
 
     def __shape(self):
         """Returns the header info and geometry for a single shape."""
+        if self.stats is not None:
+            return _countShape(self.stats, "decodeTime", self.stats["shp"], self.__readShape)
+        return self.__readShape()
+
+    def __shapeArrays(self):
+        """Returns the geometry for a single shape decoded into arrays."""
+        if self.stats is not None:
+            return _countShape(self.stats, "decodeTime", self.stats["shp"], self.__readShapeArrays)
+        return self.__readShapeArrays()
+
+    def __readShape(self):
+        """Reads the header info and geometry for a single shape."""
+        if self.arrays:
+            return self.__readShapeArrays()
         f = self.__getFileObj(self.shp)
         record = _Shape()
         nParts = nPoints = zmin = zmax = mmin = mmax = None
@@ -363,23 +1070,117 @@ class Reader:
         f.seek(next)
         return record
 
+    def __readShapeArrays(self):
+        """Reads the geometry for a single shape with one call for
+        the whole record content. Points are returned as a contiguous (N, 2)
+        float64 array, parts and part types as int32 arrays and z and m
+        values as float64 arrays. Measure nodata values become NaN."""
+        f = self.__getFileObj(self.shp)
+        (recNum, recLength) = unpack(">2i", f.read(8))
+        return self.__decodeArrays(self.__read(f, 2 * recLength))
+
+    def __decodeArrays(self, buf):
+        """Decodes the content of one geometry record from a buffer
+        without copying the coordinate blocks."""
+        record = _Shape()
+        nParts = nPoints = 0
+        shapeType = unpack_from("<i", buf)[0]
+        record.shapeType = shapeType
+        pos = 4
+        if shapeType == 0:
+            record.points = np.empty((0, 2))
+            return record
+        # All shape types capable of having a bounding box
+        if shapeType in (3,5,8,13,15,18,23,25,28,31):
+            record.bbox = np.frombuffer(buf, "<f8", 4, pos)
+            pos += 32
+        # Shape types with parts
+        if shapeType in (3,5,13,15,23,25,31):
+            nParts = unpack_from("<i", buf, pos)[0]
+            pos += 4
+        # Shape types with points
+        if shapeType in (3,5,8,13,15,18,23,25,28,31):
+            nPoints = unpack_from("<i", buf, pos)[0]
+            pos += 4
+        # Read parts
+        if nParts:
+            record.parts = np.frombuffer(buf, "<i4", nParts, pos)
+            pos += nParts * 4
+        # Read part types for Multipatch - 31
+        if shapeType == 31:
+            record.partTypes = np.frombuffer(buf, "<i4", nParts, pos)
+            pos += nParts * 4
+        # Read a single point
+        if shapeType in (1,11,21):
+            nPoints = 1
+        record.points = np.frombuffer(buf, "<f8", 2 * nPoints, pos).reshape(nPoints, 2)
+        pos += nPoints * 16
+        # Read z extremes and values, a single point has no extremes
+        if shapeType in (13,15,18,31):
+            pos += 16
+        if shapeType in (11,13,15,18,31):
+            record.z = np.frombuffer(buf, "<f8", nPoints, pos)
+            pos += nPoints * 8
+        # Read m extremes and values, they are optional for z types so only
+        # read them if the record content actually holds them
+        if shapeType in (13,15,18,23,25,28,31):
+            pos += 16
+        if shapeType in (11,13,15,18,21,23,25,28,31) and pos + nPoints * 8 <= len(buf):
+            m = np.frombuffer(buf, "<f8", nPoints, pos)
+            # Measure values less than -10e38 are nodata values according to the spec
+            if (m < -10e38).any():
+                m = np.where(m < -10e38, np.nan, m)
+            record.m = m
+        return record
+
+    def __shxIndex(self):
+        """Reads the complete offset/length table of the .shx index file
+        with a single read and caches it as arrays of byte values."""
+        shx = self.shx
+        # File length (16-bit word * 2 = bytes) - header length
+        shx.seek(24)
+        shxRecordLength = (unpack(">i", shx.read(4))[0] * 2) - 100
+        numRecords = shxRecordLength // 8
+        # Jump to the first record.
+        shx.seek(100)
+        table = shx.read(numRecords * 8)
+        numRecords = len(table) // 8
+        # Offsets and lengths are big-endian 16-bit words just like the file length
+        if np is not None:
+            index = np.frombuffer(table, ">i4", numRecords * 2).reshape(-1, 2).astype(np.int64) * 2
+            self._offsets = index[:, 0]
+            self._lengths = index[:, 1]
+        else:
+            index = array.array("i", table[:numRecords * 8])
+            if sys.byteorder == "little":
+                index.byteswap()
+            self._offsets = array.array("q", [v * 2 for v in index[0::2]])
+            self._lengths = array.array("q", [v * 2 for v in index[1::2]])
+
+    @property
+    def offsets(self):
+        """The byte offsets of all geometry records in the .shp file as
+        listed in the .shx index file, or None without an index file."""
+        if self.shx and self._offsets is None:
+            self.__shxIndex()
+        return self._offsets
+
+    @property
+    def lengths(self):
+        """The content lengths in bytes of all geometry records (excluding
+        the 8 byte record header), or None without an index file."""
+        if self.shx and self._lengths is None:
+            self.__shxIndex()
+        return self._lengths
+
     def __shapeIndex(self, i=None):
         """Returns the offset in a .shp file for a shape based on information
         in the .shx index file."""
         shx = self.shx
         if not shx:
             return None
-        if not self._offsets:
-            # File length (16-bit word * 2 = bytes) - header length
-            shx.seek(24)
-            shxRecordLength = (unpack(">i", shx.read(4))[0] * 2) - 100
-            numRecords = shxRecordLength // 8
-            # Jump to the first record.
-            shx.seek(100)
-            for r in range(numRecords):
-                # Offsets are 16-bit words just like the file length
-                self._offsets.append(unpack(">i", shx.read(4))[0] * 2)
-                shx.seek(shx.tell() + 4)
+        if self._offsets is None:
+            self.__shxIndex()
         if not i == None:
             return self._offsets[i]
 
@@ -388,17 +1189,55 @@ class Reader:
         record file."""
         shp = self.__getFileObj(self.shp)
         i = self.__restrictIndex(i)
+        if self.cacheSize:
+            if i in self.__cache:
+                self.cacheStats["hits"] += 1
+                self.__cache[i] = self.__cache.pop(i)
+                return self.__cache[i][0]
+            self.cacheStats["misses"] += 1
         offset = self.__shapeIndex(i)
         if not offset:
             # Shx index not available so iterate the full list.
             for j,k in enumerate(self.iterShapes()):
                 if j == i:
-                    return k
+                    return self.__cacheShape(i, k)
         shp.seek(offset)
-        return self.__shape()
+        return self.__cacheShape(i, self.__shape())
+
+    def __cacheShape(self, i, shape):
+        """Adds a shape to the cache, evicting the least recently used
+        shapes until the cache fits into cacheSize again."""
+        if not self.cacheSize:
+            return shape
+        size = _shapeSize(shape)
+        if size > self.cacheSize:
+            return shape
+        self.__cache[i] = (shape, size)
+        self.cacheStats["bytes"] += size
+        while self.cacheStats["bytes"] > self.cacheSize:
+            j, (evicted, evictedSize) = self.__cache.popitem(last=False)
+            self.cacheStats["bytes"] -= evictedSize
+            self.cacheStats["evictions"] += 1
+        return shape
+
+    def prefetch(self, indices):
+        """Decodes the given shapes into the cache, reading them in the
+        order of their offsets in the .shp file. Requires a cacheSize and
+        an .shx file."""
+        if not self.cacheSize:
+            raise ShapefileException("Prefetching requires a cacheSize.")
+        if not self.shx:
+            raise ShapefileException("Prefetching requires an .shx file.")
+        shp = self.__getFileObj(self.shp)
+        indices = set(self.__restrictIndex(i) for i in indices)
+        for i in sorted(indices - set(self.__cache), key=lambda i: self.offsets[i]):
+            shp.seek(self.offsets[i])
+            self.__cacheShape(i, self.__shape())
 
     def shapes(self):
         """Returns all shapes in a shapefile."""
+        if self.binaryCache:
+            return self.__cachedShapes()
         shp = self.__getFileObj(self.shp)
         # Found shapefiles which report incorrect
         # shp file length in the header. Can't trust
@@ -422,6 +1261,193 @@ class Reader:
         while shp.tell() < self.shpLength:
             yield self.__shape()    
 
+    def readRange(self, start=0, stop=None):
+        """Decodes the shapes from index start up to (excluding) stop into
+        contiguous arrays, returned in a dictionary with the keys 'coords'
+        (all vertices as an (N, 2) array), 'partOffsets' (the first vertex
+        of every part followed by N), 'featureOffsets' (the first part of
+        every shape followed by the number of parts), 'bbox' (one row per
+        shape, NaN for null shapes), 'shapeType' and, for shape types with
+        elevation or measure, 'z' and 'm'. Points and multipoints count as a
+        single part. The arrays can be passed on to Writer.polyArrays().
+        Like a slice, a stop past the last shape ends the range at the last
+        shape. Requires numpy."""
+        if np is None:
+            raise ShapefileException("Array decoding requires numpy.")
+        if start < 0:
+            raise IndexError("Shape index out of range.")
+        if self.binaryCache and start == 0 and stop is None:
+            arrays = self.__getBinaryCache()
+            return dict((k, v) for k, v in arrays.items() if not k.startswith("field:") and k != "deleted")
+        return self.__readRange(start, stop)
+
+    def __readRange(self, start, stop):
+        """Decodes a range of shapes into contiguous arrays."""
+        shp = self.__getFileObj(self.shp)
+        shapes = []
+        if self.shx:
+            stop = len(self.offsets) if stop is None else min(stop, len(self.offsets))
+            for i in range(start, stop):
+                shp.seek(self.offsets[i])
+                shapes.append(self.__shapeArrays())
+        else:
+            shp.seek(0,2)
+            shpLength = shp.tell()
+            shp.seek(100)
+            i = 0
+            while shp.tell() < shpLength and (stop is None or i < stop):
+                shape = self.__shapeArrays()
+                if i >= start:
+                    shapes.append(shape)
+                i += 1
+        return self.__joinArrays(shapes)
+
+    def __joinArrays(self, shapes):
+        """Joins a list of array backed shapes into contiguous arrays."""
+        numShapes = len(shapes)
+        bbox = np.full((numShapes, 4), np.nan)
+        partOffsets = []
+        featureOffsets = [0]
+        numVertices = 0
+        for k, shape in enumerate(shapes):
+            nPoints = len(shape.points)
+            if hasattr(shape, "bbox"):
+                bbox[k] = shape.bbox
+            elif nPoints:
+                bbox[k] = np.tile(shape.points[0], 2)
+            if nPoints:
+                parts = getattr(shape, "parts", [0])
+                partOffsets.append(np.asarray(parts, np.int64) + numVertices)
+                featureOffsets.append(featureOffsets[-1] + len(parts))
+            else:
+                featureOffsets.append(featureOffsets[-1])
+            numVertices += nPoints
+        result = {
+            "coords": np.concatenate([s.points for s in shapes] + [np.empty((0, 2))]),
+            "partOffsets": np.concatenate(partOffsets + [[numVertices]]).astype(np.int64),
+            "featureOffsets": np.array(featureOffsets, np.int64),
+            "bbox": bbox,
+            "shapeType": np.array([s.shapeType for s in shapes], np.int32),
+            }
+        for key, types in (("z", (11,13,15,18,31)), ("m", (11,13,15,18,21,23,25,28,31))):
+            if self.shapeType in types:
+                result[key] = np.concatenate([getattr(s, key, np.full(len(s.points), np.nan))
+                                              for s in shapes] + [np.empty(0)])
+        return result
+
+    def iter_batches(self, batch_size=10000):
+        """Serves up the shapefile in chunks of batch_size shapes, each as a
+        tuple (coords, partOffsets, featureOffsets, bboxes, records). The
+        geometry arrays follow the conventions of readRange() with offsets
+        relative to the chunk. records is a dictionary of column arrays as
+        returned by columns(), with an additional boolean array under the
+        key 'DeletionFlag' marking deleted records so that the rows stay
+        aligned with the shapes, or None without a .dbf file. Only one chunk
+        is held in memory at a time. Requires numpy."""
+        if np is None:
+            raise ShapefileException("Array decoding requires numpy.")
+        if batch_size < 1:
+            raise ShapefileException("The batch size must be positive.")
+        shp = self.__getFileObj(self.shp)
+        names = [field[0] for field in self.fields[1:]]
+        shp.seek(0,2)
+        shpLength = shp.tell()
+        shp.seek(100)
+        start = 0
+        while shp.tell() < shpLength:
+            shapes = []
+            while shp.tell() < shpLength and len(shapes) < batch_size:
+                shapes.append(self.__shapeArrays())
+            arrays = self.__joinArrays(shapes)
+            records = None
+            if self.dbf:
+                records, deleted = self.__readColumns(names, start, len(shapes))
+                records["DeletionFlag"] = deleted
+            yield (arrays["coords"], arrays["partOffsets"], arrays["featureOffsets"],
+                   arrays["bbox"], records)
+            start += len(shapes)
+
+    def read_parallel(self, workers=None):
+        """Decodes all shapes with a pool of worker processes and returns
+        the same dictionary of arrays as readRange(). The records are split
+        into byte ranges of similar size and every worker opens its own
+        Reader, so only the resulting arrays are sent back between the
+        processes. Requires numpy, an .shx file and a shapefile on disk
+        or in a zip archive."""
+        if np is None:
+            raise ShapefileException("Array decoding requires numpy.")
+        if not self.shx or not (os.path.isfile("%s.shp" % self.shapeName) or _splitZipPath(self.shapeName)):
+            raise ShapefileException("Parallel reading requires a shapefile on disk with an .shx file.")
+        from concurrent.futures import ProcessPoolExecutor
+        offsets = np.asarray(self.offsets)
+        if len(offsets) == 0:
+            return self.readRange(0, 0)
+        workers = workers or os.cpu_count() or 1
+        splits = np.linspace(offsets[0], offsets[-1] + 1, workers + 1)
+        bounds = np.unique(np.searchsorted(offsets, splits))
+        starts, stops = bounds[:-1].tolist(), bounds[1:].tolist()
+        with ProcessPoolExecutor(len(starts)) as pool:
+            ranges = list(pool.map(_readRange, [self.shapeName] * len(starts), starts, stops,
+                                   [self.memoryMapped] * len(starts)))
+        return _concatRanges(ranges)
+
+    def __recordBoxes(self):
+        """Returns (record index, bbox) tuples for all non-null geometry
+        records, read from the record headers without decoding the shapes."""
+        f = self.__getFileObj(self.shp)
+        if self.shx:
+            offsets = self.offsets
+        else:
+            # No index file so walk the record headers
+            f.seek(0, 2)
+            shpLength = f.tell()
+            offsets = []
+            offset = 100
+            while offset < shpLength:
+                f.seek(offset + 4)
+                offsets.append(offset)
+                offset += 8 + 2 * unpack(">i", f.read(4))[0]
+        boxes = []
+        for i, offset in enumerate(offsets):
+            f.seek(offset + 8)
+            shapeType = unpack("<i", f.read(4))[0]
+            if shapeType in (1,11,21):
+                x, y = unpack("<2d", f.read(16))
+                boxes.append((i, (x, y, x, y)))
+            elif shapeType != 0:
+                boxes.append((i, unpack("<4d", f.read(32))))
+        return boxes
+
+    def __getSpatialIndex(self):
+        """Returns the spatial index, loading it from the sidecar .rtx file
+        if that is still valid for the .shp file or building it otherwise."""
+        if self.__spatialIndex is None:
+            path = shpSize = shpMtime = None
+            if os.path.isfile("%s.shp" % self.shapeName):
+                path = "%s.rtx" % self.shapeName
+                stat = os.stat("%s.shp" % self.shapeName)
+                shpSize, shpMtime = stat.st_size, stat.st_mtime
+                self.__spatialIndex = _SpatialIndex.load(path, shpSize, shpMtime)
+            if self.__spatialIndex is None:
+                self.__spatialIndex = _SpatialIndex.build(self.__recordBoxes())
+                if path:
+                    try:
+                        self.__spatialIndex.save(path, shpSize, shpMtime)
+                    except EnvironmentError:
+                        # Read-only location, keep the index in memory only
+                        pass
+        return self.__spatialIndex
+
+    def queryIndices(self, bbox):
+        """Returns the sorted indices of the shapes whose bounding box
+        intersects bbox [xmin, ymin, xmax, ymax]."""
+        return self.__getSpatialIndex().query(bbox)
+
+    def query(self, bbox):
+        """Returns the shapes whose bounding box intersects bbox
+        [xmin, ymin, xmax, ymax]. Only the matching shapes are decoded."""
+        return [self.shape(i) for i in self.queryIndices(bbox)]
+
     def __dbfHeaderLength(self):
         """Retrieves the header length of a dbf file header."""
         if not self.__dbfHdrLength:
@@ -458,17 +1484,38 @@ class Reader:
 
     def __recordFmt(self):
         """Calculates the size of a .shp geometry record."""
-        if not self.numRecords:
-            self.__dbfHeader()
-        fmt = ''.join(['%ds' % fieldinfo[2] for fieldinfo in self.fields])
-        fmtSize = calcsize(fmt)
-        return (fmt, fmtSize)
+        if self.__recFmt is None:
+            if not self.numRecords:
+                self.__dbfHeader()
+            fmt = ''.join(['%ds' % fieldinfo[2] for fieldinfo in self.fields])
+            fmtSize = calcsize(fmt)
+            self.__recFmt = (fmt, fmtSize)
+        return self.__recFmt
 
     def __record(self):
         """Reads and returns a dbf record row as a list of values."""
         f = self.__getFileObj(self.dbf)
         recFmt = self.__recordFmt()
-        recordContents = unpack(recFmt[0], f.read(recFmt[1]))
+        if isinstance(f, mmap.mmap):
+            # Unpack the fields straight from the mapping
+            recordContents = unpack_from(recFmt[0], f, f.tell())
+            f.seek(f.tell() + recFmt[1])
+        else:
+            recordContents = unpack(recFmt[0], f.read(recFmt[1]))
+        return self.__decodeRecord(recordContents)
+
+    def __decodeRecord(self, recordContents):
+        """Decodes the unpacked raw fields of a dbf record row."""
+        if self.stats is None:
+            return self.__decodeFields(recordContents)
+        start = _clock()
+        record = self.__decodeFields(recordContents)
+        self.stats["records"]["records"] += 1
+        self.stats["records"]["decodeTime"] += _clock() - start
+        return record
+
+    def __decodeFields(self, recordContents):
+        """Decodes the fields of a dbf record row, None if it is deleted."""
         if recordContents[0] != b(' '):
             # deleted record
             return None
@@ -477,32 +1524,67 @@ class Reader:
                                                                                                 recordContents):
             if name == 'DeletionFlag':
                 continue
-            elif not value.strip():
-                record.append(value)
-                continue
-            elif typ == "N":
-                value = value.replace(b('\0'), b('')).strip()
-                if value == b(''):
-                    value = 0
-                elif deci:
-                    value = float(value)
-                else:
-                    value = int(value)
-            elif typ == b('D'):
-                try:
-                    y, m, d = int(value[:4]), int(value[4:6]), int(value[6:8])
-                    value = [y, m, d]
-                except:
-                    value = value.strip()
-            elif typ == b('L'):
-                value = (value in b('YyTt') and b('T')) or \
-                                        (value in b('NnFf') and b('F')) or b('?')
+            record.append(self.__decodeValue(typ, deci, value))
+        return record
+
+    def __decodeValue(self, typ, deci, value):
+        """Decodes a single raw dbf field value."""
+        if not value.strip():
+            return value
+        elif typ == "N":
+            value = value.replace(b('\0'), b('')).strip()
+            if value == b(''):
+                value = 0
+            elif deci:
+                value = float(value)
             else:
-                value = u(value)
+                value = int(value)
+        elif typ == b('D'):
+            try:
+                y, m, d = int(value[:4]), int(value[4:6]), int(value[6:8])
+                value = [y, m, d]
+            except:
                 value = value.strip()
-            record.append(value)
+        elif typ == b('L'):
+            value = (value in b('YyTt') and b('T')) or \
+                                    (value in b('NnFf') and b('F')) or b('?')
+        else:
+            value = u(value)
+            value = value.strip()
+        return value
+
+    def __fieldSlices(self, fields):
+        """Returns a table of (type, decimals, start, end) tuples locating
+        the named fields within a raw dbf record row."""
+        if self.__slices is None:
+            self.__slices = {}
+            offset = 0
+            for (name, typ, size, deci) in self.fields:
+                self.__slices[name] = (typ, deci, offset, offset + size)
+                offset += size
+        for name in fields:
+            if name not in self.__slices or name == 'DeletionFlag':
+                raise ShapefileException("Unknown field %s." % name)
+        return [self.__slices[name] for name in fields]
+
+    def __projectedRecord(self, row, slices):
+        """Decodes only the given field slices of a raw dbf record row."""
+        if self.stats is None:
+            return self.__projectFields(row, slices)
+        start = _clock()
+        record = self.__projectFields(row, slices)
+        self.stats["records"]["records"] += 1
+        self.stats["records"]["decodeTime"] += _clock() - start
         return record
 
+    def __projectFields(self, row, slices):
+        """Decodes the field slices of a raw dbf record row, None if it
+        is deleted."""
+        if row[:1] != b(' '):
+            # deleted record
+            return None
+        return [self.__decodeValue(typ, deci, row[start:end]) for (typ, deci, start, end) in slices]
+
     def record(self, i=0):
         """Returns a specific dbf record based on the supplied index."""
         f = self.__getFileObj(self.dbf)
@@ -514,37 +1596,234 @@ class Reader:
         f.seek(self.__dbfHeaderLength() + (i * recSize))
         return self.__record()
 
-    def records(self):
-        """Returns all records in a dbf file."""
+    def records(self, fields=None):
+        """Returns all records in a dbf file. If a list of field names is
+        given only those fields are decoded and returned, in that order."""
         if not self.numRecords:
             self.__dbfHeader()
         records = []
         f = self.__getFileObj(self.dbf)
         f.seek(self.__dbfHeaderLength())
+        if fields is not None:
+            slices = self.__fieldSlices(fields)
+            recSize = self.__recordFmt()[1]
+            data = f.read(self.numRecords * recSize)
+            for start in xrange(0, len(data) - recSize + 1, recSize):
+                r = self.__projectedRecord(data[start:start + recSize], slices)
+                if r is not None:
+                    records.append(r)
+            return records
         for i in range(self.numRecords):
             r = self.__record()
             if r:
                 records.append(r)
         return records
 
-    def iterRecords(self):
+    def iterRecords(self, fields=None):
         """Serves up records in a dbf file as an iterator.
-        Useful for large shapefiles or dbf files."""
+        Useful for large shapefiles or dbf files. If a list of field
+        names is given only those fields are decoded and returned."""
         if not self.numRecords:
             self.__dbfHeader()
         f = self.__getFileObj(self.dbf)
         f.seek(self.__dbfHeaderLength())
+        if fields is not None:
+            slices = self.__fieldSlices(fields)
+            recSize = self.__recordFmt()[1]
+            for i in xrange(self.numRecords):
+                r = self.__projectedRecord(f.read(recSize), slices)
+                if r is not None:
+                    yield r
+            return
         for i in xrange(self.numRecords):
             r = self.__record()
             if r:
                 yield r
 
+    def columns(self, fields=None):
+        """Reads the whole dbf record block in one pass and returns a
+        dictionary with one NumPy array per field plus a boolean array
+        flagging deleted records. Numeric fields become int64 (blanks are 0;
+        float64 if a value exceeds the int64 range) or float64 (blanks are
+        NaN), dates datetime64[D] (NaT if invalid), logical fields the bytes
+        T, F or ? and all other fields str arrays.
+        The optional fields argument restricts the result to the named
+        fields."""
+        if np is None:
+            raise ShapefileException("Columnar reading requires numpy.")
+        # The deletion flags are returned separately, not as a field
+        known = [field[0] for field in self.fields[1:]]
+        if fields is None:
+            fields = known
+        for name in fields:
+            if name not in known:
+                raise ShapefileException("Unknown field %s." % name)
+        if self.binaryCache:
+            arrays = self.__getBinaryCache()
+            return dict((name, arrays["field:" + name]) for name in fields), arrays["deleted"]
+        return self.__readColumns(fields)
+
+    def __readColumns(self, fields, start=0, count=None):
+        """Decodes the named dbf fields of count records from record start
+        on into arrays."""
+        f = self.__getFileObj(self.dbf)
+        recSize = self.__recordFmt()[1]
+        # Describe the fixed-width record layout as a structured dtype
+        names, formats, offsets = [], [], []
+        offset = 0
+        for (name, typ, size, deci) in self.fields:
+            if name == 'DeletionFlag' or name in fields:
+                names.append(name)
+                formats.append("S%d" % size)
+                offsets.append(offset)
+            offset += size
+        layout = np.dtype({"names": names, "formats": formats,
+                           "offsets": offsets, "itemsize": recSize})
+        if count is None:
+            count = self.numRecords - start
+        count = max(min(count, self.numRecords - start), 0)
+        f.seek(self.__dbfHeaderLength() + start * recSize)
+        table = np.frombuffer(self.__read(f, count * recSize), layout, count)
+        decodeStart = _clock()
+        types = dict((field[0], field[1:]) for field in self.fields)
+        columns = {}
+        for name in fields:
+            typ, size, deci = types[name]
+            columns[name] = _decodeColumn(table[name], typ, deci)
+        deleted = table['DeletionFlag'] != b(' ')
+        if self.stats is not None:
+            self.stats["records"]["records"] += count
+            self.stats["records"]["decodeTime"] += _clock() - decodeStart
+        return columns, deleted
+
     def shapeRecord(self, i=0):
         """Returns a combination geometry and attribute record for the
         supplied record index."""
         i = self.__restrictIndex(i)
         return _ShapeRecord(shape=self.shape(i), record=self.record(i))
 
+    def __getBinaryCache(self):
+        """Returns the arrays of the binary cache, mapping the cache file if
+        it matches the current source files and (re)building it otherwise.
+        If the cache file cannot be written the arrays are kept in memory."""
+        if self.__binaryArrays is None:
+            path = key = None
+            if os.path.isfile("%s.shp" % self.shapeName):
+                path = "%s.shpcache" % self.shapeName
+                key = _BinaryCache.key(self.shapeName)
+                self.__binaryArrays = _BinaryCache.load(path, key)
+            if self.__binaryArrays is None:
+                arrays = self.__readRange(0, None)
+                if self.dbf:
+                    names = [field[0] for field in self.fields[1:]]
+                    columns, deleted = self.__readColumns(names)
+                    for name in names:
+                        arrays["field:" + name] = columns[name]
+                    arrays["deleted"] = deleted
+                self.__binaryArrays = arrays
+                if path:
+                    try:
+                        _BinaryCache.save(path, key, arrays)
+                        self.__binaryArrays = _BinaryCache.load(path, key) or arrays
+                    except EnvironmentError:
+                        pass
+        return self.__binaryArrays
+
+    def __cachedShapes(self):
+        """Returns all shapes as array backed shape objects that are views
+        into the binary cache."""
+        arrays = self.__getBinaryCache()
+        coords, partOffsets, featureOffsets = arrays["coords"], arrays["partOffsets"], arrays["featureOffsets"]
+        shapes = []
+        for k, shapeType in enumerate(arrays["shapeType"].tolist()):
+            shape = _Shape(shapeType)
+            first, last = featureOffsets[k], featureOffsets[k + 1]
+            start, end = partOffsets[first], partOffsets[last]
+            shape.points = coords[start:end]
+            if shapeType == NULL:
+                shapes.append(shape)
+                continue
+            if shapeType not in (1,11,21):
+                shape.bbox = arrays["bbox"][k]
+            if shapeType in (3,5,13,15,23,25,31):
+                shape.parts = partOffsets[first:last] - start
+            for name in ("z", "m"):
+                if name in arrays:
+                    setattr(shape, name, arrays[name][start:end])
+            shapes.append(shape)
+        return shapes
+
+    def iterShapeRecords(self, where=None):
+        """Serves up combinations of geometry and attribute records as an
+        iterator. The optional where clause is evaluated on the raw dbf rows
+        so that geometry and the remaining fields are only decoded for the
+        matching records. It is either a dictionary of field names and
+        values, e.g. {'ID': 5} or {'ID': [5, 7, 9]}, or a list of
+        (field, operator, value) tuples that all have to match, with the
+        operators ==, !=, <, <=, >, >=, in and between (inclusive (min, max)
+        range), e.g. [('LENGTH', '>', 100), ('NAME', 'in', ['Sobat', 'Baro'])].
+        Deleted records are skipped."""
+        f = self.__getFileObj(self.dbf)
+        recFmt = self.__recordFmt()
+        test = _compileWhere(self.fields, where) if where else None
+        shapes = None
+        if not self.shx:
+            # Without an index the geometry has to be read sequentially
+            shapes = self.iterShapes()
+        for i in xrange(self.numRecords):
+            f.seek(self.__dbfHeaderLength() + i * recFmt[1])
+            row = f.read(recFmt[1])
+            shape = next(shapes) if shapes else None
+            if row[:1] != b(' ') or (test and not test(row)):
+                continue
+            record = self.__decodeRecord(unpack(recFmt[0], row))
+            yield _ShapeRecord(shape=shape if shapes else self.shape(i), record=record)
+
+    def to_geojson_stream(self, path, ndjson=True):
+        """Writes all shapes and their attributes as GeoJSON features to a
+        file name or file-like object, one record at a time so the layer is
+        never held in memory. With ndjson=True every feature is written on
+        a line of its own, otherwise a FeatureCollection is written. Ring
+        orientation is computed vectorized on each record's coordinates.
+        Deleted records are skipped. Returns the number of features written.
+        Requires numpy."""
+        if np is None:
+            raise ShapefileException("GeoJSON export requires numpy.")
+        shp = self.__getFileObj(self.shp)
+        if self.dbf:
+            names = [field[0] for field in self.fields[1:]]
+            recFmt = self.__recordFmt()
+            self.dbf.seek(self.__dbfHeaderLength())
+        out = path if hasattr(path, "write") else open(path, "w")
+        count = 0
+        try:
+            if not ndjson:
+                out.write('{"type": "FeatureCollection", "features": [\n')
+            shp.seek(0,2)
+            shpLength = shp.tell()
+            shp.seek(100)
+            while shp.tell() < shpLength:
+                shape = self.__shapeArrays()
+                properties = {}
+                if self.dbf:
+                    record = self.__decodeRecord(unpack(recFmt[0], self.dbf.read(recFmt[1])))
+                    if record is None:
+                        continue
+                    properties = dict(zip(names, record))
+                if count and not ndjson:
+                    out.write(",\n")
+                out.write('{"type": "Feature", "geometry": %s, "properties": %s}' %
+                          (_jsonGeometry(shape), json.dumps(properties, default=_jsonValue)))
+                if ndjson:
+                    out.write("\n")
+                count += 1
+            if not ndjson:
+                out.write("\n]}\n")
+        finally:
+            if out is not path:
+                out.close()
+        return count
+
     def shapeRecords(self):
         """Returns a list of combination geometry/attribute records for
         all records in a shapefile."""
@@ -553,8 +1832,32 @@ class Reader:
                                 for rec in zip(self.shapes(), self.records())]
 
 class Writer:
-    """Provides write support for ESRI Shapefiles."""
-    def __init__(self, shapeType=None):
+    """Provides write support for ESRI Shapefiles.
+
+    By default all shapes and records are kept in memory until save() is
+    called. If a target file name is passed, either as Writer(target,
+    shapeType) or Writer(shapeType, target), the three files are opened
+    right away and every shape and record is written to disk as soon as it
+    is added. The extents are tracked along the way and the file headers
+    are written by close(), which is called automatically when the Writer
+    is used as a context manager.
+
+    With append=True an existing shapefile at target is opened for update
+    instead: new shapes and records are written after the existing ones and
+    close() only patches the file headers.
+
+    Dbf records are encoded batchSize records at a time into one buffer
+    that is written as a single block.
+
+    Passing stats=True counts the writes, bytes and seeks on each file and
+    the time spent in them, and the time spent encoding shapes (in total
+    and per shape type) and records, see Reader.
+    """
+    batchSize = 4096
+
+    def __init__(self, shapeType=None, target=None, append=False, stats=False):
+        if is_string(shapeType):
+            shapeType, target = target, shapeType
         self._shapes = []
         self.fields = []
         self.records = []
@@ -565,20 +1868,172 @@ class Writer:
         # Geometry record offsets and lengths for writing shx file.
         self._offsets = []
         self._lengths = []
+        # Original shape indices in the order written by save(spatial_sort=...)
+        self.spatialOrder = None
         # Use deletion flags in dbf? Default is false (0).
         self.deletionFlag = 0
-
-    def __getFileObj(self, f):
+        # State of a streaming Writer
+        self._streaming = False
+        self._numShapes = 0
+        self._numRecords = 0
+        self._extents = None
+        self.__dbfStarted = False
+        self.__appending = False
+        self.__dbfEof = False
+        # Precompiled dbf record layout and records waiting to be flushed
+        self.__layout = None
+        self.__pending = []
+        self.stats = _newStats(("shp", "shx", "dbf"), "encodeTime") if stats else None
+        if target:
+            if append and os.path.isfile(os.path.splitext(target)[0] + ".shp"):
+                self.__openAppend(target)
+            else:
+                self.__openStream(target)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def __openStream(self, target):
+        """Opens the three target files of a streaming Writer and reserves
+        space for the shp and shx headers."""
+        base = os.path.splitext(target)[0]
+        self.shp = self.__getFileObj(base + ".shp", "shp")
+        self.shx = self.__getFileObj(base + ".shx", "shx")
+        self.dbf = self.__getFileObj(base + ".dbf", "dbf")
+        self.shp.write(b("\0") * 100)
+        self.shx.write(b("\0") * 100)
+        self._streaming = True
+
+    def __openAppend(self, target):
+        """Opens the files of an existing shapefile for update and positions
+        them after the last shape and record."""
+        base = os.path.splitext(target)[0]
+        r = Reader(base)
+        if self.shapeType is None or (r.shapeType == NULL and not len(r.offsets)):
+            self.shapeType = self.shapeType if self.shapeType is not None else r.shapeType
+        elif self.shapeType != r.shapeType:
+            for f in (r.shp, r.shx, r.dbf):
+                f.close()
+            raise ShapefileException("Cannot append shape type %s to %s, which holds shape type %s." %
+                                     (self.shapeType, base, r.shapeType))
+        self.fields = [tuple(field) for field in r.fields if field[0] != 'DeletionFlag']
+        self._numShapes = len(r.offsets)
+        self._numRecords = r.numRecords
+        if self._numShapes:
+            self._extents = list(r.bbox) + list(r.elevation) + list(r.measure)
+        for f in (r.shp, r.shx, r.dbf):
+            f.close()
+        self.shp = self.__countIO(open(base + ".shp", "r+b"), "shp")
+        self.shp.seek(0, 2)
+        self.shx = self.__countIO(open(base + ".shx", "r+b"), "shx")
+        self.shx.seek(100 + 8 * self._numShapes)
+        self.dbf = self.__countIO(open(base + ".dbf", "r+b"), "dbf")
+        self.dbf.seek(8)
+        headerLength, recordLength = unpack("<2H", self.dbf.read(4))
+        end = headerLength + self._numRecords * recordLength
+        # Keep an end-of-file marker at the end if the file has one
+        self.dbf.seek(end)
+        self.__dbfEof = self.dbf.read(1) == b("\x1a")
+        self.dbf.seek(end)
+        self.__dbfStarted = True
+        self.__appending = True
+        self._streaming = True
+
+    def close(self):
+        """Writes the headers of a streaming Writer and closes its files.
+        Has no effect on a Writer that keeps its content in memory."""
+        if not self._streaming:
+            return
+        if self.shapeType is None:
+            self.shapeType = NULL
+        self.__flushRecords()
+        self.__shapefileHeader(self.shp, headerType='shp')
+        self.__shapefileHeader(self.shx, headerType='shx')
+        if self.__appending:
+            # Only the date and the record count change in the dbf header
+            if self.__dbfEof:
+                self.dbf.write(b("\x1a"))
+            self.dbf.truncate()
+            year, month, day = time.localtime()[:3]
+            self.dbf.seek(1)
+            self.dbf.write(pack("<BBBL", year - 1900, month, day, self._numRecords))
+        else:
+            self.__dbfHeader()
+        for f in (self.shp, self.shx, self.dbf):
+            f.close()
+        self._streaming = False
+
+    def __addShape(self, shape):
+        """Keeps a new shape in memory or, when streaming, writes it to the
+        shp and shx files right away and updates the extents."""
+        if not self._streaming:
+            self._shapes.append(shape)
+            return
+        if self.shapeType is None:
+            self.shapeType = shape.shapeType
+        self._numShapes += 1
+        offset, length = self.__shpRecord(self.shp, shape, self._numShapes)
+        self.shx.write(pack(">2i", offset // 2, length))
+        if len(shape.points):
+            x1, y1, x2, y2 = self.__bbox([shape])
+            z = self.__zbox([shape])
+            m = self.__mbox([shape])
+            if self._extents is None:
+                self._extents = [x1, y1, x2, y2] + z + m
+            else:
+                e = self._extents
+                self._extents = [min(e[0], x1), min(e[1], y1), max(e[2], x2), max(e[3], y2),
+                                 min(e[4], z[0]), max(e[5], z[1]), min(e[6], m[0]), max(e[7], m[1])]
+
+    def __addRecord(self, record):
+        """Keeps a new record in memory or, when streaming, writes it to
+        the dbf file right away."""
+        if not self._streaming:
+            self.records.append(record)
+            return
+        if not self.__dbfStarted:
+            # The header is rewritten with the final record count by close()
+            self.__dbfHeader()
+            self.__dbfStarted = True
+        self._numRecords += 1
+        self.__pending.append(record)
+        if len(self.__pending) >= self.batchSize:
+            self.__flushRecords()
+
+    def __flushRecords(self):
+        """Writes the records a streaming Writer collected so far as one
+        block."""
+        if self.__pending:
+            self.dbf.write(self.__encodeRecords(self.__pending))
+            self.__pending = []
+
+    def __getFileObj(self, f, name=None):
         """Safety handler to verify file-like objects"""
         if not f:
             raise ShapefileException("No file-like object available.")
         elif hasattr(f, "write"):
-            return f
+            return self.__countIO(f, name)
         else:
             pth = os.path.split(f)[0]
             if pth and not os.path.exists(pth):
                 os.makedirs(pth)
-            return open(f, "wb")
+            return self.__countIO(open(f, "wb"), name)
+
+    def __countIO(self, f, name):
+        """Wraps a file object to count the I/O on it if stats are enabled."""
+        if self.stats is None or name is None or isinstance(f, _CountingFile):
+            return f
+        return _CountingFile(f, self.stats[name])
+
+    def logStats(self, logger=None, level=logging.INFO):
+        """Logs the I/O statistics, by default to the 'shapefile' logger.
+        Requires a Writer created with stats=True."""
+        if self.stats is None:
+            raise ShapefileException("I/O statistics require a Writer created with stats=True.")
+        _logStats("Writer", self.stats, logger, level)
 
     def __shpFileLength(self):
         """Calculates the file length of the shp file."""
@@ -588,6 +2043,8 @@ class Writer:
         for s in self._shapes:
             # Add in record header and shape type fields
             size += 12
+            if s.shapeType == NULL:
+                continue
             # nParts and nPoints do not apply to all shapes
             #if self.shapeType not in (0,1):
             #       nParts = len(s.parts)
@@ -621,7 +2078,7 @@ class Writer:
                 # z array
                 size += 8 * nPoints
             # Calc m extremes and values
-            if self.shapeType in (23,25,31):
+            if self.shapeType in (13,15,23,25,31):
                 # m extremes
                 size += 16
                 # m array
@@ -646,6 +2103,13 @@ class Writer:
             shapeType = self.shapeType
             if shapeTypes:
                 shapeType = shapeTypes[shapes.index(s)]
+            if not len(s.points):
+                continue
+            if _isArray(s.points):
+                # Shapes added by polyArrays() carry their bounding box
+                x.extend(s.bbox[0::2])
+                y.extend(s.bbox[1::2])
+                continue
             px, py = list(zip(*s.points))[:2]
             x.extend(px)
             y.extend(py)
@@ -654,6 +2118,9 @@ class Writer:
     def __zbox(self, shapes, shapeTypes=[]):
         z = []
         for s in shapes:
+            if _isArray(s.points):
+                z.extend(getattr(s, "zbox", []))
+                continue
             try:
                 for p in s.points:
                     z.append(p[2])
@@ -665,6 +2132,9 @@ class Writer:
     def __mbox(self, shapes, shapeTypes=[]):
         m = [0]
         for s in shapes:
+            if _isArray(s.points):
+                m.extend(getattr(s, "mbox", []))
+                continue
             try:
                 for p in s.points:
                     m.append(p[3])
@@ -676,14 +2146,20 @@ class Writer:
         """Returns the current bounding box for the shapefile which is
         the lower-left and upper-right corners. It does not contain the
         elevation or measure extremes."""
+        if self._streaming:
+            return (self._extents or [0] * 8)[:4]
         return self.__bbox(self._shapes)
 
     def zbox(self):
         """Returns the current z extremes for the shapefile."""
+        if self._streaming:
+            return (self._extents or [0] * 8)[4:6]
         return self.__zbox(self._shapes)
 
     def mbox(self):
         """Returns the current m extremes for the shapefile."""
+        if self._streaming:
+            return (self._extents or [0] * 8)[6:]
         return self.__mbox(self._shapes)
 
     def __shapefileHeader(self, fileObj, headerType='shp'):
@@ -696,9 +2172,16 @@ class Writer:
         f.write(pack(">6i", 9994,0,0,0,0,0))
         # File length (Bytes / 2 = 16-bit words)
         if headerType == 'shp':
-            f.write(pack(">i", self.__shpFileLength()))
+            if self._streaming:
+                f.seek(0, 2)
+                length = f.tell() // 2
+                f.seek(24)
+            else:
+                length = self.__shpFileLength()
+            f.write(pack(">i", length))
         elif headerType == 'shx':
-            f.write(pack('>i', ((100 + (len(self._shapes) * 8)) // 2)))
+            numShapes = self._numShapes if self._streaming else len(self._shapes)
+            f.write(pack('>i', ((100 + (numShapes * 8)) // 2)))
         # Version, Shape type
         f.write(pack("<2i", 1000, self.shapeType))
         # The shapefile's bounding box (lower left, upper right)
@@ -729,7 +2212,8 @@ class Writer:
         for field in self.fields:
             if field[0].startswith("Deletion"):
                 self.fields.remove(field)
-        numRecs = len(self.records)
+        self.__layout = None
+        numRecs = self._numRecords if self._streaming else len(self.records)
         numFields = len(self.fields)
         headerLength = numFields * 32 + 33
         recordLength = sum([int(field[2]) for field in self.fields]) + 1
@@ -753,117 +2237,158 @@ class Writer:
         """Write the shp records"""
         f = self.__getFileObj(self.shp)
         f.seek(100)
+        self._offsets = []
+        self._lengths = []
         recNum = 1
         for s in self._shapes:
-            self._offsets.append(f.tell())
-            # Record number, Content length place holder
-            f.write(pack(">2i", recNum, 0))
+            offset, length = self.__shpRecord(f, s, recNum)
+            self._offsets.append(offset)
+            self._lengths.append(length)
             recNum += 1
-            start = f.tell()
-            # Shape Type
-            if self.shapeType != 31:
-                s.shapeType = self.shapeType
-            f.write(pack("<i", s.shapeType))
-            # All shape types capable of having a bounding box
-            if s.shapeType in (3,5,8,13,15,18,23,25,28,31):
-                try:
-                    f.write(pack("<4d", *self.__bbox([s])))
-                except error:
-                    raise ShapefileException("Falied to write bounding box for record %s. Expected floats." % recNum)
-            # Shape types with parts
-            if s.shapeType in (3,5,13,15,23,25,31):
-                # Number of parts
-                f.write(pack("<i", len(s.parts)))
-            # Shape types with multiple points per record
-            if s.shapeType in (3,5,8,13,15,23,25,31):
-                # Number of points
-                f.write(pack("<i", len(s.points)))
-            # Write part indexes
-            if s.shapeType in (3,5,13,15,23,25,31):
-                for p in s.parts:
-                    f.write(pack("<i", p))
-            # Part types for Multipatch (31)
-            if s.shapeType == 31:
-                for pt in s.partTypes:
-                    f.write(pack("<i", pt))
-            # Write points for multiple-point records
-            if s.shapeType in (3,5,8,13,15,23,25,31):
-                try:
-                    [f.write(pack("<2d", *p[:2])) for p in s.points]
-                except error:
-                    raise ShapefileException("Failed to write points for record %s. Expected floats." % recNum)
-            # Write z extremes and values
-            if s.shapeType in (13,15,18,31):
+
+    def __shpRecord(self, f, s, recNum):
+        """Writes a single shp record at the current position of f and
+        returns its offset and its content length in 16-bit words."""
+        if self.stats is not None:
+            return _countShape(self.stats, "encodeTime", self.stats["shp"], self.__writeShpRecord, f, s, recNum)
+        return self.__writeShpRecord(f, s, recNum)
+
+    def __writeShpRecord(self, f, s, recNum):
+        """Writes a single shp record."""
+        # Shape Type, null shapes are allowed in any shapefile
+        if self.shapeType != 31 and s.shapeType != NULL:
+            s.shapeType = self.shapeType
+        if _isArray(s.points):
+            return self.__shpRecordArrays(f, s, recNum)
+        offset = f.tell()
+        # Record number, Content length place holder
+        f.write(pack(">2i", recNum, 0))
+        start = f.tell()
+        f.write(pack("<i", s.shapeType))
+        # All shape types capable of having a bounding box
+        if s.shapeType in (3,5,8,13,15,18,23,25,28,31):
+            try:
+                f.write(pack("<4d", *self.__bbox([s])))
+            except error:
+                raise ShapefileException("Falied to write bounding box for record %s. Expected floats." % recNum)
+        # Shape types with parts
+        if s.shapeType in (3,5,13,15,23,25,31):
+            # Number of parts
+            f.write(pack("<i", len(s.parts)))
+        # Shape types with multiple points per record
+        if s.shapeType in (3,5,8,13,15,23,25,31):
+            # Number of points
+            f.write(pack("<i", len(s.points)))
+        # Write part indexes
+        if s.shapeType in (3,5,13,15,23,25,31):
+            for p in s.parts:
+                f.write(pack("<i", p))
+        # Part types for Multipatch (31)
+        if s.shapeType == 31:
+            for pt in s.partTypes:
+                f.write(pack("<i", pt))
+        # Write points for multiple-point records
+        if s.shapeType in (3,5,8,13,15,23,25,31):
+            try:
+                [f.write(pack("<2d", *p[:2])) for p in s.points]
+            except error:
+                raise ShapefileException("Failed to write points for record %s. Expected floats." % recNum)
+        # Write z extremes and values
+        if s.shapeType in (13,15,18,31):
+            try:
+                f.write(pack("<2d", *self.__zbox([s])))
+            except error:
+                raise ShapefileException("Failed to write elevation extremes for record %s. Expected floats." % recNum)
+            try:
+                if hasattr(s,"z"):
+                    f.write(pack("<%sd" % len(s.z), *s.z))
+                else:
+                    [f.write(pack("<d", p[2])) for p in s.points]  
+            except error:
+                raise ShapefileException("Failed to write elevation values for record %s. Expected floats." % recNum)
+        # Write m extremes and values
+        if s.shapeType in (13,15,18,23,25,28,31):
+            try:
+                if hasattr(s,"m"):
+                    f.write(pack("<%sd" % len(s.m), *s.m))
+                else:
+                    f.write(pack("<2d", *self.__mbox([s])))
+            except error:
+                raise ShapefileException("Failed to write measure extremes for record %s. Expected floats" % recNum)
+            try:
+                [f.write(pack("<d", p[3])) for p in s.points]
+            except error:
+                raise ShapefileException("Failed to write measure values for record %s. Expected floats" % recNum)
+        # Write a single point
+        if s.shapeType in (1,11,21):
+            try:
+                f.write(pack("<2d", s.points[0][0], s.points[0][1]))
+            except error:
+                raise ShapefileException("Failed to write point for record %s. Expected floats." % recNum)
+        # Write a single Z value
+        if s.shapeType == 11:
+            if hasattr(s, "z"):
                 try:
-                    f.write(pack("<2d", *self.__zbox([s])))
+                    if not s.z:
+                        s.z = (0,)    
+                    f.write(pack("<d", s.z[0]))
                 except error:
-                    raise ShapefileException("Failed to write elevation extremes for record %s. Expected floats." % recNum)
-                try:
-                    if hasattr(s,"z"):
-                        f.write(pack("<%sd" % len(s.z), *s.z))
-                    else:
-                        [f.write(pack("<d", p[2])) for p in s.points]  
-                except error:
-                    raise ShapefileException("Failed to write elevation values for record %s. Expected floats." % recNum)
-            # Write m extremes and values
-            if s.shapeType in (13,15,18,23,25,28,31):
+                    raise ShapefileException("Failed to write elevation value for record %s. Expected floats." % recNum)
+            else:
                 try:
-                    if hasattr(s,"m"):
-                        f.write(pack("<%sd" % len(s.m), *s.m))
-                    else:
-                        f.write(pack("<2d", *self.__mbox([s])))
+                    if len(s.points[0])<3:
+                        s.points[0].append(0)
+                    f.write(pack("<d", s.points[0][2]))
                 except error:
-                    raise ShapefileException("Failed to write measure extremes for record %s. Expected floats" % recNum)
+                    raise ShapefileException("Failed to write elevation value for record %s. Expected floats." % recNum)
+        # Write a single M value
+        if s.shapeType in (11,21):
+            if hasattr(s, "m"):
                 try:
-                    [f.write(pack("<d", p[3])) for p in s.points]
+                    if not s.m:
+                        s.m = (0,) 
+                    f.write(pack("<1d", s.m[0]))
                 except error:
-                    raise ShapefileException("Failed to write measure values for record %s. Expected floats" % recNum)
-            # Write a single point
-            if s.shapeType in (1,11,21):
+                    raise ShapefileException("Failed to write measure value for record %s. Expected floats." % recNum)    
+            else:                                
                 try:
-                    f.write(pack("<2d", s.points[0][0], s.points[0][1]))
+                    if len(s.points[0])<4:
+                        s.points[0].append(0)
+                    f.write(pack("<1d", s.points[0][3]))
                 except error:
-                    raise ShapefileException("Failed to write point for record %s. Expected floats." % recNum)
-            # Write a single Z value
-            if s.shapeType == 11:
-                if hasattr(s, "z"):
-                    try:
-                        if not s.z:
-                            s.z = (0,)    
-                        f.write(pack("<d", s.z[0]))
-                    except error:
-                        raise ShapefileException("Failed to write elevation value for record %s. Expected floats." % recNum)
-                else:
-                    try:
-                        if len(s.points[0])<3:
-                            s.points[0].append(0)
-                        f.write(pack("<d", s.points[0][2]))
-                    except error:
-                        raise ShapefileException("Failed to write elevation value for record %s. Expected floats." % recNum)
-            # Write a single M value
-            if s.shapeType in (11,21):
-                if hasattr(s, "m"):
-                    try:
-                        if not s.m:
-                            s.m = (0,) 
-                        f.write(pack("<1d", s.m[0]))
-                    except error:
-                        raise ShapefileException("Failed to write measure value for record %s. Expected floats." % recNum)    
-                else:                                
-                    try:
-                        if len(s.points[0])<4:
-                            s.points[0].append(0)
-                        f.write(pack("<1d", s.points[0][3]))
-                    except error:
-                        raise ShapefileException("Failed to write measure value for record %s. Expected floats." % recNum)
-            # Finalize record length as 16-bit words
-            finish = f.tell()
-            length = (finish - start) // 2
-            self._lengths.append(length)
-            # start - 4 bytes is the content length field
-            f.seek(start-4)
-            f.write(pack(">i", length))
-            f.seek(finish)
+                    raise ShapefileException("Failed to write measure value for record %s. Expected floats." % recNum)
+        # Finalize record length as 16-bit words
+        finish = f.tell()
+        length = (finish - start) // 2
+        # start - 4 bytes is the content length field
+        f.seek(start-4)
+        f.write(pack(">i", length))
+        f.seek(finish)
+        return offset, length
+
+    def __shpRecordArrays(self, f, s, recNum):
+        """Writes a shp record of a shape added by polyArrays() by packing
+        its arrays into one buffer and returns its offset and content
+        length in 16-bit words."""
+        offset = f.tell()
+        nPoints = len(s.points)
+        content = [pack("<i", s.shapeType), np.asarray(s.bbox, "<f8").tobytes()]
+        if s.shapeType in (3,5,13,15,23,25):
+            content.append(pack("<2i", len(s.parts), nPoints))
+            content.append(np.asarray(s.parts, "<i4").tobytes())
+        else:
+            content.append(pack("<i", nPoints))
+        content.append(np.asarray(s.points, "<f8").tobytes())
+        if s.shapeType in (13,15):
+            content.append(pack("<2d", *getattr(s, "zbox", (0, 0))))
+            content.append(np.asarray(getattr(s, "z", np.zeros(nPoints)), "<f8").tobytes())
+        if s.shapeType in (13,15,23,25):
+            content.append(pack("<2d", *getattr(s, "mbox", (0, 0))))
+            content.append(np.asarray(getattr(s, "m", np.zeros(nPoints)), "<f8").tobytes())
+        content = b("").join(content)
+        length = len(content) // 2
+        f.write(pack(">2i", recNum, length) + content)
+        return offset, length
 
     def __shxRecords(self):
         """Writes the shx records."""
@@ -876,31 +2401,95 @@ class Writer:
     def __dbfRecords(self):
         """Writes the dbf records."""
         f = self.__getFileObj(self.dbf)
-        for record in self.records:
-            if not self.fields[0][0].startswith("Deletion"):
-                f.write(b(' ')) # deletion flag
-            for (fieldName, fieldType, size, dec), value in zip(self.fields, record):
-                fieldType = fieldType.upper()
-                size = int(size)
-                if fieldType.upper() == "N":
-                    value = str(value).rjust(size)
-                elif fieldType == 'L':
-                    value = str(value)[0].upper()
+        for start in range(0, len(self.records), self.batchSize):
+            f.write(self.__encodeRecords(self.records[start:start + self.batchSize]))
+
+    def __dbfLayout(self):
+        """Precompiles the fixed-width dbf record layout from the fields.
+        Returns the fields, the record length, a format string producing a
+        whole record (deletion flag included) and the indices of the logical
+        fields, whose values are upper cased before formatting."""
+        if self.__layout is None:
+            fields = [(name, fieldType.upper(), int(size), dec) for (name, fieldType, size, dec)
+                      in self.fields if not name.startswith("Deletion")]
+            fmt = " "
+            logical = []
+            for k, (name, fieldType, size, dec) in enumerate(fields):
+                if fieldType == "N":
+                    fmt += "%%%ds" % size
+                elif fieldType == "L":
+                    # One character padded to the field width, so that like
+                    # all other fields it never comes out shorter
+                    fmt += "%%-%d.1s" % size
+                    logical.append(k)
                 else:
-                    value = str(value)[:size].ljust(size)
-                assert len(value) == size
-                value = b(value)
-                f.write(value)
+                    fmt += "%%-%d.%ds" % (size, size)
+            recordLength = 1 + sum([field[2] for field in fields])
+            self.__layout = (fields, recordLength, fmt, logical)
+        return self.__layout
+
+    def __encodeValue(self, field, value):
+        """Encodes a single value into exactly the width of its field."""
+        name, fieldType, size, dec = field
+        if fieldType == "N":
+            value = b(str(value)).rjust(size)
+        elif fieldType == "L":
+            value = b(str(value)[:1].upper()).ljust(size)
+        else:
+            # Cut encoded text on a character boundary
+            value = b(str(value))[:size].decode("utf-8", "ignore").encode("utf-8").ljust(size)
+        if len(value) != size:
+            raise ShapefileException("Value %r does not fit into field %s." % (value, name))
+        return value
+
+    def __encodeRecords(self, records):
+        """Encodes a batch of records into one preallocated buffer. Values
+        are formatted as str(value), numbers right and text left aligned.
+        Rows are formatted with the precompiled layout in one step. Every
+        field is formatted to at least its width, so a row comes out at the
+        record length only if every field fits; the other rows (non-ASCII
+        text or values that are too wide) are encoded field by field."""
+        if self.stats is not None:
+            start = _clock()
+            buf = self.__encodeRows(records)
+            self.stats["records"]["records"] += len(records)
+            self.stats["records"]["encodeTime"] += _clock() - start
+            return buf
+        return self.__encodeRows(records)
+
+    def __encodeRows(self, records):
+        """Encodes a batch of records with the precompiled layout."""
+        fields, recordLength, fmt, logical = self.__dbfLayout()
+        numFields = len(fields)
+        buf = bytearray(recordLength * len(records))
+        pos = 0
+        for record in records:
+            if len(record) < numFields:
+                raise ShapefileException("Record has %d values but there are %d fields." %
+                                         (len(record), numFields))
+            values = tuple(record[:numFields])
+            if logical:
+                values = list(values)
+                for k in logical:
+                    values[k] = str(values[k]).upper()
+                values = tuple(values)
+            row = b(fmt % values)
+            if len(row) != recordLength:
+                row = b(" ") + b("").join([self.__encodeValue(field, value)
+                                            for field, value in zip(fields, record)])
+            buf[pos:pos + recordLength] = row
+            pos += recordLength
+        return buf
 
     def null(self):
         """Creates a null shape."""
-        self._shapes.append(_Shape(NULL))
+        self.__addShape(_Shape(NULL))
 
     def point(self, x, y, z=0, m=0):
         """Creates a point shape."""
         pointShape = _Shape(self.shapeType)
         pointShape.points.append([x, y, z, m])
-        self._shapes.append(pointShape)
+        self.__addShape(pointShape)
 
     def line(self, parts=[], shapeType=POLYLINE):
         """Creates a line shape. This method is just a convienience method
@@ -937,11 +2526,64 @@ class Writer:
                 for part in parts:
                     partTypes.append(polyShape.shapeType)
             polyShape.partTypes = partTypes
-        self._shapes.append(polyShape)
+        self.__addShape(polyShape)
+
+    def polyArrays(self, coords, partOffsets, featureOffsets=None, z=None, m=None, shapeType=POLYGON):
+        """Creates many poly shapes at once from a ragged coordinate array.
+        coords is an (N, 2) array of vertices. partOffsets holds the index of
+        the first vertex of every part followed by N, featureOffsets the
+        index of the first part of every shape followed by the number of
+        parts (by default every part is a shape of its own). z and m are
+        optional arrays of N values. Polygon rings must already be closed.
+        Shapes without any vertex become null shapes. The bounding boxes are
+        computed vectorized and each shape is written with a single buffer.
+        Requires numpy."""
+        if np is None:
+            raise ShapefileException("Bulk writing requires numpy.")
+        if shapeType not in (3,5,8,13,15,23,25):
+            raise ShapefileException("Bulk writing does not support shape type %s." % shapeType)
+        coords = np.ascontiguousarray(coords, dtype="<f8").reshape(-1, 2)
+        partOffsets = np.asarray(partOffsets, dtype=np.int64)
+        if featureOffsets is None:
+            featureOffsets = np.arange(len(partOffsets))
+        featureOffsets = np.asarray(featureOffsets, dtype=np.int64)
+        vertexOffsets = partOffsets[featureOffsets]
+        starts = vertexOffsets[:-1]
+        filled = np.diff(vertexOffsets) > 0
+        # reduceat over the starts of non-empty shapes covers exactly their vertices
+        bboxes = np.zeros((len(starts), 4))
+        if filled.any():
+            bboxes[filled, :2] = np.minimum.reduceat(coords, starts[filled])
+            bboxes[filled, 2:] = np.maximum.reduceat(coords, starts[filled])
+        extras = {}
+        for name, values in (("z", z), ("m", m)):
+            if values is not None:
+                values = np.ascontiguousarray(values, dtype="<f8")
+                boxes = np.zeros((len(starts), 2))
+                if filled.any():
+                    boxes[filled, 0] = np.minimum.reduceat(values, starts[filled])
+                    boxes[filled, 1] = np.maximum.reduceat(values, starts[filled])
+                extras[name] = (values, boxes)
+        for k in range(len(starts)):
+            if not filled[k]:
+                self.null()
+                continue
+            start, end = vertexOffsets[k], vertexOffsets[k + 1]
+            polyShape = _Shape(shapeType)
+            polyShape.parts = partOffsets[featureOffsets[k]:featureOffsets[k + 1]] - start
+            polyShape.points = coords[start:end]
+            polyShape.bbox = bboxes[k]
+            for name, (values, boxes) in extras.items():
+                setattr(polyShape, name, values[start:end])
+                setattr(polyShape, name + "box", boxes[k])
+            self.__addShape(polyShape)
 
     def field(self, name, fieldType="C", size="50", decimal=0):
         """Adds a dbf field descriptor to the shapefile."""
+        if self.__dbfStarted:
+            raise ShapefileException("Fields must be added before the first record is written.")
         self.fields.append((name, fieldType, size, decimal))
+        self.__layout = None
 
     def record(self, *recordList, **recordDict):
         """Creates a dbf attribute record. You can submit either a sequence of
@@ -966,7 +2608,61 @@ class Writer:
                     else:
                         record.append(val)
         if record:
-            self.records.append(record)
+            self.__addRecord(record)
+
+    def recordColumns(self, columns):
+        """Creates many dbf attribute records at once from a dictionary
+        mapping field names to equally long sequences or arrays of values.
+        Fields missing from the dictionary are left blank. The values are
+        formatted exactly as by record(). When streaming, numeric fields
+        given as arrays of numbers are formatted vectorized (requires numpy)
+        and all rows are written to the dbf file as one block."""
+        fields = [field for field in self.fields if not field[0].startswith("Deletion")]
+        lengths = set(len(values) for values in columns.values())
+        if len(lengths) > 1:
+            raise ShapefileException("All columns must have the same length.")
+        numRecords = lengths.pop() if lengths else 0
+        if not self._streaming or np is None:
+            blank = [""] * numRecords
+            values = [columns.get(field[0], blank) for field in fields]
+            # Iterate numpy scalars rather than tolist(), which would turn
+            # e.g. float32 values into longer Python float strings
+            values = [list(v) if _isArray(v) else v for v in values]
+            for record in zip(*values):
+                self.__addRecord(list(record))
+            return
+        if not self.__dbfStarted:
+            self.__dbfHeader()
+            self.__dbfStarted = True
+        self.__flushRecords()
+        fields, recordLength, fmt, logical = self.__dbfLayout()
+        names, formats, offsets = ["DeletionFlag"], ["S1"], [0]
+        offset = 1
+        for k, field in enumerate(fields):
+            names.append("f%d" % k)
+            formats.append("S%d" % field[2])
+            offsets.append(offset)
+            offset += field[2]
+        table = np.empty(numRecords, np.dtype({"names": names, "formats": formats,
+                                               "offsets": offsets, "itemsize": recordLength}))
+        table["DeletionFlag"] = b(" ")
+        for k, field in enumerate(fields):
+            name, fieldType, size, dec = field
+            values = columns.get(name)
+            if values is None:
+                table["f%d" % k] = b(" ") * size
+                continue
+            array = np.asarray(values)
+            if fieldType == "N" and array.dtype.kind in "iuf":
+                text = np.char.rjust(array.astype(str), size)
+                if numRecords and np.char.str_len(text).max() > size:
+                    raise ShapefileException("Values of field %s do not fit into %d characters." %
+                                             (name, size))
+                table["f%d" % k] = text.astype("S%d" % size)
+            else:
+                table["f%d" % k] = [self.__encodeValue(field, value) for value in values]
+        self.dbf.write(table.tobytes())
+        self._numRecords += numRecords
 
     def shape(self, i):
         return self._shapes[i]
@@ -981,7 +2677,7 @@ class Writer:
             target = os.path.splitext(target)[0] + '.shp'
         if not self.shapeType:
             self.shapeType = self._shapes[0].shapeType
-        self.shp = self.__getFileObj(target)
+        self.shp = self.__getFileObj(target, "shp")
         self.__shapefileHeader(self.shp, headerType='shp')
         self.__shpRecords()
 
@@ -991,7 +2687,7 @@ class Writer:
             target = os.path.splitext(target)[0] + '.shx'
         if not self.shapeType:
             self.shapeType = self._shapes[0].shapeType
-        self.shx = self.__getFileObj(target)
+        self.shx = self.__getFileObj(target, "shx")
         self.__shapefileHeader(self.shx, headerType='shx')
         self.__shxRecords()
 
@@ -999,19 +2695,71 @@ class Writer:
         """Save a dbf file."""
         if not hasattr(target, "write"):
             target = os.path.splitext(target)[0] + '.dbf'
-        self.dbf = self.__getFileObj(target)
+        self.dbf = self.__getFileObj(target, "dbf")
         self.__dbfHeader()
         self.__dbfRecords()
 
-    def save(self, target=None, shp=None, shx=None, dbf=None):
+    def __hilbertOrder(self):
+        """Returns the shape indices sorted by the Hilbert curve position of
+        their bounding box centers. Null shapes go last."""
+        centers = []
+        for i, s in enumerate(self._shapes):
+            if s.shapeType == NULL or not len(s.points):
+                continue
+            x1, y1, x2, y2 = self.__bbox([s])
+            centers.append(((x1 + x2) / 2.0, (y1 + y2) / 2.0, i))
+        if not centers:
+            return list(range(len(self._shapes)))
+        xs, ys = [c[0] for c in centers], [c[1] for c in centers]
+        xmin, ymin = min(xs), min(ys)
+        cells = (1 << 16) - 1
+        xscale = cells / ((max(xs) - xmin) or 1.0)
+        yscale = cells / ((max(ys) - ymin) or 1.0)
+        keys = sorted((_hilbertIndex(int((x - xmin) * xscale), int((y - ymin) * yscale)), i)
+                      for x, y, i in centers)
+        ordered = [i for key, i in keys]
+        placed = set(ordered)
+        return ordered + [i for i in range(len(self._shapes)) if i not in placed]
+
+    def save(self, target=None, shp=None, shx=None, dbf=None, spatial_sort=None):
         """Save the shapefile data to three files or
         three file-like objects. SHP and DBF files can also
         be written exclusively using saveShp, saveShx, and saveDbf respectively.
         If target is specified but not shp,shx, or dbf then the target path and
         file name are used.  If no options or specified, a unique base file name
         is generated to save the files and the base file name is returned as a 
-        string. 
+        string. A streaming Writer already writes to the files it was
+        created with, so it takes no targets and save() just closes it.
+
+        With spatial_sort='hilbert' the shapes and their records are written
+        in the order of the Hilbert curve position of their bounding box
+        centers, so shapes close to each other end up close in the files and
+        bounding box queries read few, nearly contiguous byte ranges. The
+        shapes and records kept in memory stay in their original order and
+        spatialOrder lists, for every written shape, its original index.
         """
+        if self._streaming:
+            if target is not None or shp is not None or shx is not None or dbf is not None:
+                raise ShapefileException("A streaming Writer writes to the files it was created "
+                                         "with, call save() or close() without a target.")
+            if spatial_sort:
+                raise ShapefileException("Spatial sorting requires a Writer that keeps its content in memory.")
+            self.close()
+            return
+        if spatial_sort:
+            if spatial_sort != "hilbert":
+                raise ShapefileException("Unknown spatial sort %r." % spatial_sort)
+            if self.records and len(self.records) != len(self._shapes):
+                raise ShapefileException("Spatial sorting requires one record per shape.")
+            shapes, records = self._shapes, self.records
+            self.spatialOrder = self.__hilbertOrder()
+            self._shapes = [shapes[i] for i in self.spatialOrder]
+            if records:
+                self.records = [records[i] for i in self.spatialOrder]
+            try:
+                return self.save(target, shp, shx, dbf)
+            finally:
+                self._shapes, self.records = shapes, records
         # Create a unique file name if one is not defined
         if shp:
             self.saveShp(shp)
@@ -1034,10 +2782,19 @@ class Writer:
             if generated:
                 return target
 class Editor(Writer):
-    def __init__(self, shapefile=None, shapeType=POINT, autoBalance=1):
+    def __init__(self, shapefile=None, shapeType=POINT, autoBalance=1, append=False):
+        """Loads an existing shapefile into memory for editing. With
+        append=True the shapefile is instead opened for update: shapes and
+        records added with point(), poly(), null() and record() are written
+        after the existing ones and close() or save() patch the headers, so
+        the existing content is neither loaded nor rewritten."""
         self.autoBalance = autoBalance
         if not shapefile:
             Writer.__init__(self, shapeType)
+        elif is_string(shapefile) and append:
+            Writer.__init__(self, None, shapefile, append=True)
+            if self.shapeType is None:
+                self.shapeType = shapeType
         elif is_string(shapefile):
             base = os.path.splitext(shapefile)[0]
             if os.path.isfile("%s.shp" % base):
@@ -1048,9 +2805,30 @@ class Editor(Writer):
                 self.records = r.records()
 
     def select(self, expr):
-        """Select one or more shapes (to be implemented)"""
-        # TODO: Implement expressions to select shapes.
-        pass
+        """Returns the indices of the shapes whose attribute records match
+        expr, a where clause as described for Reader.iterShapeRecords().
+        Not available with append=True, as the records are not loaded."""
+        if self._streaming:
+            raise ShapefileException("select() is not available in append mode, "
+                                     "use Reader.iterShapeRecords(where=...) instead.")
+        fields = [field for field in self.fields if not field[0].startswith("Deletion")]
+        names = [field[0] for field in fields]
+        columns = []
+        for name, op, value in _whereConditions(expr):
+            if name not in names:
+                raise ShapefileException("Unknown field %s in where clause." % name)
+            k = names.index(name)
+            typ = fields[k][1]
+            if typ in ("N", "F"):
+                decode = lambda v: v
+            elif typ == "L":
+                decode = lambda v: _rawLogical(v) if isinstance(v, bytes) else v
+            else:
+                # Compare text like Reader.iterShapeRecords() does
+                value, decode = _textTarget(op, value), _textValue
+            columns.append((k, op, value, decode))
+        return [i for i, record in enumerate(self.records)
+                if all(_test(d(record[k]), op, value) for k, op, value, d in columns)]
 
     def delete(self, shape=None, part=None, point=None):
         """Deletes the specified part of any shape by specifying a shape
@@ -1124,7 +2902,8 @@ class Editor(Writer):
             shape, part, point = addr
             self._shapes[shape][part][point] = [x, y, z, m]
         else:
-            Writer.point(self, x, y, z, m)
+            # Unset elevation and measure default to 0 as in Writer.point
+            Writer.point(self, x, y, z or 0, m or 0)
         if self.autoBalance:
             self.balance()
 
@@ -1138,9 +2917,13 @@ class Editor(Writer):
         """Adds a corresponding empty attribute or null geometry record depending
         on which type of record was created to make sure all three files
         are in synch."""
-        if len(self.records) > len(self._shapes):
+        if self._streaming:
+            numRecords, numShapes = self._numRecords, self._numShapes
+        else:
+            numRecords, numShapes = len(self.records), len(self._shapes)
+        if numRecords > numShapes:
             self.null()
-        elif len(self.records) < len(self._shapes):
+        elif numRecords < numShapes:
             self.record()
 
     def __fieldNorm(self, fieldName):
@@ -0,0 +1,41 @@
+"""Tests of shapefile.py, run with pytest from this folder."""
+
+import os
+
+import numpy as np
+
+import shapefile
+
+VALUES = np.array([0.1, 2.5], np.float32)
+
+
+def write_points(w, columns):
+    w.field("VALUE", "N", 10, 3)
+    w.field("TEXT", "C", 20)
+    for i in range(len(VALUES)):
+        w.point(i, i)
+    if columns:
+        w.recordColumns({"VALUE": VALUES, "TEXT": VALUES})
+    else:
+        for value in VALUES:
+            w.record(value, value)
+
+
+def test_record_columns_formats_like_record(tmpdir):
+    """recordColumns() writes the same dbf bytes in memory and when
+    streaming, and the same as record() does."""
+    dbfs = []
+    for columns, streaming in ((False, False), (True, False), (True, True)):
+        target = os.path.join(str(tmpdir), "points%d%d" % (columns, streaming))
+        if streaming:
+            with shapefile.Writer(target, shapefile.POINT) as w:
+                write_points(w, columns)
+        else:
+            w = shapefile.Writer(shapefile.POINT)
+            write_points(w, columns)
+            w.save(target)
+        with open(target + ".dbf", "rb") as f:
+            dbfs.append(f.read())
+    assert dbfs[0] == dbfs[1] == dbfs[2]
+    r = shapefile.Reader(os.path.join(str(tmpdir), "points11"))
+    assert r.records() == [[0.1, "0.1"], [2.5, "2.5"]]